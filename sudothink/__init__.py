@@ -6,6 +6,12 @@ __version__ = "1.0.0"
 __author__ = "Vusal Abdullayev"
 __email__ = "abdulla.vusal.3@gmail.com"
 
-from .assistant import AITerminalAssistant
+__all__ = ["AITerminalAssistant"]
 
-__all__ = ["AITerminalAssistant"] 
\ No newline at end of file
+
+def __getattr__(name):
+    # Loaded lazily so `sudothink --help` and `sudothink setup` skip the OpenAI SDK
+    if name == "AITerminalAssistant":
+        from .assistant import AITerminalAssistant
+        return AITerminalAssistant
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}") 
\ No newline at end of file
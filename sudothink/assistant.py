@@ -1,195 +1,473 @@
 #!/usr/bin/env python3
 import os
 import sys
-import subprocess
-import json
 import platform
-from datetime import datetime
-from openai import OpenAI, AuthenticationError
+import sqlite3
+import time
+import threading
 from .config import Config
+from .backend import Backend, data_dir
+from .timing import Timings
+from .routing import ModelRouter, complexity_score
+from .validate import check_command
+from .candidates import generate_candidates, DEFAULT_CANDIDATES
+from .manindex import ManIndex
+from .retrieval import Retriever, DEFAULT_EXAMPLE_CONFIDENCE, DEFAULT_EXAMPLES
+from .pathindex import PathIndex
+from .history import current_history_file, tail_history
+from .dirtree import DirectorySnapshot
+from .collect import collect
+from .prefetch import load_snapshot, snapshot_file, shell_pid, DEFAULT_MAX_AGE as DEFAULT_PREFETCH_AGE
+from .prompt import PromptBuilder, PromptSection, count_tokens, DEFAULT_MAX_TOKENS as DEFAULT_PROMPT_TOKENS
+from .interactions import InteractionLog, DEFAULT_MAX_AGE_DAYS, DEFAULT_MAX_BYTES
+from .context_store import ContextStore, DEFAULT_MAX_ENTRIES as DEFAULT_CONTEXT_ENTRIES, DEFAULT_MAX_BYTES as DEFAULT_CONTEXT_BYTES
+from .plan import execute_plan, plan_options
+from .cache import ResponseCache, cache_key, context_fingerprint, cwd_class, DEFAULT_TTL, DEFAULT_MAX_ENTRIES
+
+SYSTEM_PROMPT = "You are a helpful terminal assistant."
+
+# Mode-specific instructions, sent in the static system prefix ahead of the
+# context (chat appends them to each user turn instead)
+MODE_TASKS = {
+    "command": """
+TASK: Generate a single, valid shell command that accomplishes the user's request.
+- Return ONLY the command, no explanations
+- Ensure it's compatible with the current OS and shell
+- Use available commands when possible
+- Consider recent command patterns
+""",
+    "plan": """
+TASK: Break down this complex task into a step-by-step plan.
+- Return a JSON array of steps
+- Each step should have: "id", "description", "command", "explanation"
+- Add "depends_on": a list of step ids that must finish first; steps that don't
+  depend on each other (e.g. independent downloads) may run in parallel
+- Ensure commands are compatible with the current system
+""",
+    "explain": """
+TASK: Explain what the user is trying to accomplish and suggest the best approach.
+- Provide a clear explanation
+- Suggest alternative approaches if applicable
+- Include any warnings or considerations
+""",
+}
+
+# Characters of each response kept as context for later prompts
+CONTEXT_SUMMARY_CHARS = 200
+
+
+def _usage_dict(usage):
+    """Token counts from an API usage object, if the server sent one"""
+    if usage is None:
+        return None
+    return {name: getattr(usage, name, None) for name in ("prompt_tokens", "completion_tokens", "total_tokens")}
+
+
+def _add_usage(total, usage):
+    """Sum token usage over several requests"""
+    if usage is None:
+        return total
+    if total is None:
+        return dict(usage)
+    return {name: (total.get(name) or 0) + (count or 0) for name, count in usage.items()}
+
+
+def _format_context_entry(entry):
+    summary = " ".join(str(entry.get("summary", "")).split())
+    if entry.get("query"):
+        return f"- ({entry.get('mode', 'command')}) {entry['query']} -> {summary}"
+    return f"- {summary}"
+
+
+class _PerThread:
+    """Instance attribute with its own value in each thread
+
+    The daemon runs several requests on one assistant at once; what one
+    request records about itself must not be read back by another.
+    """
+
+    def __init__(self, default=None):
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def _local(self, obj):
+        return obj.__dict__.setdefault("_per_thread", threading.local())
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        return getattr(self._local(obj), self.name, self.default)
+
+    def __set__(self, obj, value):
+        setattr(self._local(obj), self.name, value)
+
 
 class AITerminalAssistant:
+    last_collection = _PerThread()
+    last_metrics = _PerThread({})
+    last_usage = _PerThread()
+
     def __init__(self):
         self.config = Config()
-        self.api_key = self.config.get_api_key()
+        self.backend = Backend.from_config(self.config)
+        self.api_key = self.backend.api_key
+        self.router = ModelRouter.from_config(self.config, self.backend)
         
         if not self.api_key:
             print("❌ OpenAI API key not configured.")
             print("💡 Run 'ai-setup' to configure your API key once, or set OPENAI_API_KEY environment variable.")
             sys.exit(1)
         
-        self.client = OpenAI(api_key=self.api_key)
+        self.last_collection = None
+        self.last_metrics = {}
+        self.last_usage = None
+        # Shell whose prefetched snapshot to use; the daemon sets it per request
+        self.shell_pid = shell_pid()
+        # Interactions, context and cached answers belong to the backend that produced them
+        self.data_dir = data_dir(self.config, self.backend)
         self.context_file = os.path.expanduser("~/.ai-terminal-context.json")
+        self.context_store = ContextStore(
+            self.data_dir / "context.jsonl",
+            max_entries=self.config.get_setting("context_max_entries", DEFAULT_CONTEXT_ENTRIES),
+            max_bytes=self.config.get_setting("context_max_bytes", DEFAULT_CONTEXT_BYTES)
+        )
+        if os.path.exists(self.context_file) and not self.backend.fake:
+            self.context_store.import_legacy(self.context_file)
         self.history_file = os.path.expanduser("~/.ai-terminal-history.log")
+        self.interactions = InteractionLog(
+            self.data_dir / "interactions.db",
+            max_age_days=self.config.get_setting("history_max_age_days", DEFAULT_MAX_AGE_DAYS),
+            max_bytes=self.config.get_setting("history_max_bytes", DEFAULT_MAX_BYTES)
+        )
+        if os.path.exists(self.history_file) and not self.backend.fake:
+            try:
+                self.interactions.import_legacy(self.history_file)
+            except (OSError, sqlite3.Error):
+                pass
+        self.man_index = ManIndex(self.config.config_dir / "man_index.db",
+                                  self.config.get_setting("man_help_programs"))
+        self.retriever = Retriever(
+            self.interactions,
+            example_confidence=self.config.get_setting("retrieval_example_confidence", DEFAULT_EXAMPLE_CONFIDENCE),
+            examples=self.config.get_setting("retrieval_examples", DEFAULT_EXAMPLES)
+        )
+        self.path_index = PathIndex(self.config.config_dir / "path_index.json")
+        self.dir_snapshot = DirectorySnapshot(self.config.config_dir / "dirtree_cache.json")
+        self.response_cache = ResponseCache(
+            self.data_dir / "response_cache.db",
+            ttl=self.config.get_setting("cache_ttl", DEFAULT_TTL),
+            max_entries=self.config.get_setting("cache_max_entries", DEFAULT_MAX_ENTRIES)
+        )
+    
+    @property
+    def client(self):
+        """Client for the configured backend, created on first use"""
+        return self.backend.client
         
-    def get_system_info(self):
+    def prefetched_context(self, cwd=None):
+        """Context the shell hooks already collected for cwd, if still fresh"""
+        if not str(self.shell_pid or "").isdigit() or not self.config.get_setting("prefetch", True):
+            return {}
+        return load_snapshot(snapshot_file(self.config.config_dir, self.shell_pid), cwd,
+                             max_age=self.config.get_setting("prefetch_max_age", DEFAULT_PREFETCH_AGE))
+    
+    def collect_context(self):
+        """Collect prompt context concurrently, each source within its own deadline"""
+        cwd = os.getcwd()
+        collectors = {
+            "available_commands": self.get_available_commands,
+            "directory_structure": lambda: self.dir_snapshot.snapshot(cwd),
+            "recent_commands": self.get_recent_commands,
+            "previous_context": self.load_context,
+        }
+        # Sources the shell hooks prefetched don't need collecting again
+        prefetched = self.prefetched_context(cwd)
+        for name in prefetched:
+            collectors.pop(name, None)
+        collection = collect(
+            collectors,
+            deadlines=self.config.get_setting("collector_deadlines"),
+            fallbacks={
+                "available_commands": [],
+                "directory_structure": "Unable to get directory structure",
+                "recent_commands": [],
+                "previous_context": [],
+            }
+        )
+        collection.values.update(prefetched)
+        collection.prefetched = list(prefetched)
+        self.last_collection = collection
+        return collection
+    
+    def get_system_info(self, collection=None):
         """Gather comprehensive system information"""
-        info = {
+        if collection is None:
+            collection = self.collect_context()
+        
+        return {
             "os": platform.system(),
             "os_version": platform.release(),
             "shell": os.getenv("SHELL", "unknown"),
             "current_dir": os.getcwd(),
             "user": os.getenv("USER", "unknown"),
             "home": os.path.expanduser("~"),
-            "available_commands": self.get_available_commands()
+            "available_commands": collection["available_commands"],
+            "directory_structure": collection["directory_structure"]
         }
-        
-        # Get directory structure (limited depth to avoid overwhelming)
-        try:
-            tree_output = subprocess.run(["find", ".", "-maxdepth", "2", "-type", "d"], 
-                                       capture_output=True, text=True, timeout=5)
-            info["directory_structure"] = tree_output.stdout[:1000]  # Limit size
-        except:
-            info["directory_structure"] = "Unable to get directory structure"
-            
-        return info
     
-    def get_available_commands(self):
+    def get_available_commands(self, limit=50):
         """Get list of available commands in PATH"""
         try:
-            path_dirs = os.getenv("PATH", "").split(":")
-            commands = set()
-            for path_dir in path_dirs:
-                if os.path.exists(path_dir):
-                    try:
-                        for file in os.listdir(path_dir):
-                            if os.access(os.path.join(path_dir, file), os.X_OK):
-                                commands.add(file)
-                    except:
-                        continue
-            return list(commands)[:50]  # Limit to first 50
+            return self.path_index.commands()[:limit]
         except:
             return []
     
     def get_recent_commands(self, limit=10):
         """Get recent commands from shell history"""
         try:
-            # Try to get from various shell history files
-            history_files = [
-                os.path.expanduser("~/.zsh_history"),
-                os.path.expanduser("~/.bash_history"),
-                os.path.expanduser("~/.history")
-            ]
-            
-            for hist_file in history_files:
-                if os.path.exists(hist_file):
-                    with open(hist_file, 'r', errors='ignore') as f:
-                        lines = f.readlines()
-                        return [line.strip() for line in lines[-limit:] if line.strip()]
+            hist_file = current_history_file()
+            if hist_file:
+                return tail_history(hist_file, limit)
         except:
             pass
         return []
     
-    def load_context(self):
-        """Load previous context if available"""
+    def load_context(self, limit=None):
+        """Load the most recent context entries, preferring the current directory"""
+        if limit is None:
+            limit = self.config.get_setting("context_entries", 5)
         try:
-            if os.path.exists(self.context_file):
-                with open(self.context_file, 'r') as f:
-                    return json.load(f)
+            return self.context_store.load_recent(limit, cwd=os.getcwd())
         except:
-            pass
-        return {}
+            return []
     
     def save_context(self, context):
-        """Save current context"""
+        """Append a context entry (for the current directory unless it names a cwd)"""
         try:
-            with open(self.context_file, 'w') as f:
-                json.dump(context, f, indent=2)
+            self.context_store.append(dict(context, cwd=context.get("cwd", os.getcwd())))
         except:
             pass
     
-    def log_interaction(self, query, response, success=True):
-        """Log the interaction for learning"""
+    def log_interaction(self, query, response, success=None, mode="command", cwd=None):
+        """Log the interaction for learning; returns its id in the interaction log
+
+        success stays None until the command has run (`sudothink history mark`).
+        """
         try:
-            with open(self.history_file, 'a') as f:
-                timestamp = datetime.now().isoformat()
-                f.write(f"[{timestamp}] Query: {query}\n")
-                f.write(f"[{timestamp}] Response: {response}\n")
-                f.write(f"[{timestamp}] Success: {success}\n\n")
-        except:
-            pass
+            return self.interactions.record(query, response, mode=mode, success=success, cwd=cwd)
+        except sqlite3.Error:
+            return None
     
     def analyze_task_complexity(self, query):
         """Analyze if task requires multiple steps"""
-        complexity_keywords = [
-            "multiple", "several", "steps", "first", "then", "after", "before",
-            "complex", "complicated", "setup", "install", "configure", "build",
-            "deploy", "migrate", "backup", "restore", "analyze", "process"
-        ]
+        return complexity_score(query) > 2
+    
+    def static_prompt(self, mode=None):
+        """Instructions that only change with the OS and mode, sent first for prompt caching"""
+        parts = [SYSTEM_PROMPT, f"You are an advanced terminal assistant for {platform.system()} systems."]
+        if mode in MODE_TASKS:
+            parts.append(MODE_TASKS[mode])
+        return parts
+    
+    def _prompt_builder(self, collection, mode=None, examples=None, references=None):
+        system_info = self.get_system_info(collection)
+        previous_context = collection["previous_context"]
         
-        query_lower = query.lower()
-        complexity_score = sum(1 for keyword in complexity_keywords if keyword in query_lower)
+        builder = PromptBuilder(
+            budgets=self.config.get_setting("prompt_budgets"),
+            max_tokens=self.config.get_setting("prompt_max_tokens", DEFAULT_PROMPT_TOKENS),
+            tokenizer=self.config.get_setting("prompt_tokenizer")
+        )
+        for text in self.static_prompt(mode):
+            builder.add_static(text)
         
-        return complexity_score > 2
+        builder.add_section(PromptSection("system_context", "SYSTEM CONTEXT", [
+            f"- OS: {system_info['os']} {system_info['os_version']}",
+            f"- Shell: {system_info['shell']}",
+            f"- Current directory: {system_info['current_dir']}",
+            f"- User: {system_info['user']}",
+        ], priority=0))
+        builder.add_section(PromptSection("recent_commands", "RECENT COMMANDS",
+                                          collection["recent_commands"], priority=1, keep="tail"))
+        builder.add_section(PromptSection("directory_structure", "DIRECTORY STRUCTURE",
+                                          system_info["directory_structure"].splitlines(), priority=2))
+        builder.add_section(PromptSection("available_commands", "AVAILABLE COMMANDS (partial list)",
+                                          system_info["available_commands"], priority=3, joiner=", "))
+        builder.add_section(PromptSection("previous_context", "PREVIOUS CONTEXT",
+                                          [_format_context_entry(entry) for entry in previous_context],
+                                          priority=4, keep="tail"))
+        if examples:
+            builder.add_section(PromptSection("similar_commands", "COMMANDS THAT WORKED FOR SIMILAR REQUESTS",
+                                              [f"- {match.query} -> {match.command}" for match in examples],
+                                              priority=1))
+        if references:
+            builder.add_section(PromptSection("man_pages", "FROM THE LOCAL MANUAL", references, priority=1))
+        return builder
+    
+    def build_context_prompt(self, collection=None):
+        """Describe the system, history and workspace for the model"""
+        if collection is None:
+            collection = self.collect_context()
+        _, context_text, _ = self._prompt_builder(collection).build()
+        return context_text
+    
+    def build_messages(self, query, mode, collection, examples=None, references=None):
+        """Chat messages for a request (static prefix first) and tokens per section"""
+        static_text, context_text, report = self._prompt_builder(collection, mode, examples, references).build()
+        request = f"USER REQUEST: {query}"
+        report["user_request"] = count_tokens(request)
+        report["total"] = report.pop("total") + report["user_request"]
+        return [
+            {"role": "system", "content": static_text},
+            {"role": "user", "content": f"{context_text}\n{request}\n"}
+        ], report
     
-    def generate_response(self, query, context=None, mode="command"):
-        """Generate AI response based on mode"""
-        system_info = self.get_system_info()
-        recent_commands = self.get_recent_commands()
-        previous_context = self.load_context()
+    def generate_response(self, query, context=None, mode="command", use_cache=True, refresh=False,
+                          stream=False, on_token=None, escalate=False, release=None):
+        """Generate AI response based on mode
         
-        # Build context-aware prompt
-        prompt = f"""
-You are an advanced terminal assistant for {system_info['os']} systems.
-
-SYSTEM CONTEXT:
-- OS: {system_info['os']} {system_info['os_version']}
-- Shell: {system_info['shell']}
-- Current directory: {system_info['current_dir']}
-- User: {system_info['user']}
-
-RECENT COMMANDS:
-{chr(10).join(recent_commands[-5:])}
-
-AVAILABLE COMMANDS (partial list):
-{', '.join(system_info['available_commands'][:20])}
-
-DIRECTORY STRUCTURE:
-{system_info['directory_structure']}
-
-PREVIOUS CONTEXT:
-{json.dumps(previous_context, indent=2) if previous_context else 'None'}
-
-USER REQUEST: {query}
-
-"""
-
-        if mode == "command":
-            prompt += """
-TASK: Generate a single, valid shell command that accomplishes the user's request.
-- Return ONLY the command, no explanations
-- Ensure it's compatible with the current OS and shell
-- Use available commands when possible
-- Consider recent command patterns
-"""
-        elif mode == "plan":
-            prompt += """
-TASK: Break down this complex task into a step-by-step plan.
-- Return a JSON array of steps
-- Each step should have: "description", "command", "explanation"
-- Ensure commands are compatible with the current system
-"""
-        elif mode == "explain":
-            prompt += """
-TASK: Explain what the user is trying to accomplish and suggest the best approach.
-- Provide a clear explanation
-- Suggest alternative approaches if applicable
-- Include any warnings or considerations
-"""
+        With stream=True, on_token is called with each piece of text as it arrives.
+        With escalate=True (a previous answer failed), the strongest model is used
+        and the cache is skipped. release() is called once the working directory
+        and environment have been read, before the request goes to the network;
+        the daemon lets the next caller in then.
+        """
+        started = time.monotonic()
+        timings = Timings()
+        # Read once: after release() the process's cwd and environment may be another caller's
+        cwd, path, shell = os.getcwd(), os.environ.get("PATH"), os.environ.get("SHELL")
+        # The cache key only needs cheap context, so a hit skips collection entirely
+        with timings.span("cache_lookup"):
+            key = cache_key(query, mode, context_fingerprint(backend=self.backend))
+            cached = None
+            if refresh:
+                self.response_cache.invalidate(key)
+            elif use_cache and not escalate:
+                try:
+                    cached = self.response_cache.get(key)
+                except sqlite3.Error:
+                    pass
+        if cached is not None:
+            elapsed = time.monotonic() - started
+            self.last_metrics = {"ttft": elapsed, "total": elapsed, "cached": True,
+                                 "timings": timings.as_ms()}
+            if stream and on_token:
+                on_token(cached)
+            self.log_interaction(query, cached, mode=mode)
+            return cached
+        
+        examples = None
+        if mode == "command" and use_cache and not refresh and not escalate \
+                and self.config.get_setting("retrieval", True):
+            with timings.span("retrieval"):
+                match, examples = self.retriever.retrieve(query, mode, accept=self._reusable)
+            if match is not None:
+                elapsed = time.monotonic() - started
+                self.last_metrics = {"ttft": elapsed, "total": elapsed, "cached": True,
+                                     "retrieved": {"query": match.query, "confidence": round(match.confidence, 2)},
+                                     "timings": timings.as_ms()}
+                self.log_interaction(query, match.command, mode=mode)
+                return match.command
+        
+        references = None
+        if mode == "explain" and self.config.get_setting("man_index", True):
+            with timings.span("man_lookup"):
+                try:
+                    answer, references = self.man_index.explain(query)
+                except (OSError, sqlite3.Error):
+                    answer = None
+            if answer is not None and not refresh and not escalate:
+                elapsed = time.monotonic() - started
+                self.last_metrics = {"ttft": elapsed, "total": elapsed, "cached": True, "manual": True,
+                                     "timings": timings.as_ms()}
+                if stream and on_token:
+                    on_token(answer)
+                self.log_interaction(query, answer, mode=mode)
+                return answer
+        
+        with timings.span("collect"):
+            collection = self.collect_context()
+        timings.update(collection.durations, prefix="collect.")
+        with timings.span("prompt_build"):
+            messages, prompt_report = self.build_messages(query, mode, collection, examples, references)
+        
+        with timings.span("import_openai"):
+            from openai import AuthenticationError
         
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are a helpful terminal assistant."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0.1,
-                max_tokens=500 if mode == "command" else 1000
-            )
+            with timings.span("client"):
+                client = self.client
+            if release:
+                release()
+            model = self.router.strongest if escalate else self.router.route(query, mode)
+            candidates = max(1, int(self.config.get_setting("command_candidates", DEFAULT_CANDIDATES)))
+            escalated = escalate
+            problems = []
+            
+            if stream:
+                request = self.completion_request(messages, mode, model)
+                sent_at = time.monotonic()
+                result, first_token_at = self._stream_completion(request, on_token)
+                usage = self.last_usage
+                finished_at = time.monotonic()
+                if first_token_at:
+                    # Until the first token is mostly network and queueing; after it, generation
+                    timings.add("network", first_token_at - sent_at)
+                    timings.add("generation", finished_at - first_token_at)
+            else:
+                first_token_at = None
+                usage = None
+                while True:
+                    request = self.completion_request(messages, mode, model)
+                    if mode != "command":
+                        with timings.span("completion"):
+                            response = client.chat.completions.create(**request)
+                        result = response.choices[0].message.content.strip()
+                        usage = _add_usage(usage, _usage_dict(getattr(response, "usage", None)))
+                        break
+                    # Candidates are validated as they arrive, so this includes validation
+                    with timings.span("completion"):
+                        result, problems, usages = generate_candidates(
+                            client, request, candidates, lambda command: self.validate_command(command, path, shell),
+                            multiple_choices=self.backend.multiple_choices
+                        )
+                    for candidate_usage in usages:
+                        usage = _add_usage(usage, _usage_dict(candidate_usage))
+                    next_model = self.router.escalate(model) if problems else None
+                    if not next_model:
+                        break
+                    # Let the stronger model see what was wrong with the rejected answer
+                    messages = messages + [
+                        {"role": "assistant", "content": result},
+                        {"role": "user", "content": f"That command was rejected ({'; '.join(problems)}). "
+                                                    "Return only a corrected command."},
+                    ]
+                    model = next_model
+                    escalated = True
+                finished_at = time.monotonic()
             
-            result = response.choices[0].message.content.strip()
-            self.log_interaction(query, result, True)
+            with timings.span("record"):
+                # A rejected command is known to be bad; the rest are marked once they have run
+                self.log_interaction(query, result, False if problems else None, mode, cwd)
+                self.save_context({"query": query, "mode": mode, "summary": result[:CONTEXT_SUMMARY_CHARS], "cwd": cwd})
+                if (use_cache or refresh) and not problems:
+                    try:
+                        self.response_cache.put(key, query, mode, result)
+                    except sqlite3.Error:
+                        pass
+            self.last_metrics = {
+                "ttft": (first_token_at or finished_at) - started,
+                "total": time.monotonic() - started,
+                "cached": False,
+                "model": request["model"],
+                "escalated": escalated,
+                "problems": problems,
+                "prompt_tokens": prompt_report,
+                "usage": usage,
+                "timings": timings.as_ms()
+            }
             return result
             
         except AuthenticationError:
@@ -199,55 +477,52 @@ TASK: Explain what the user is trying to accomplish and suggest the best approac
             print(f"❌ LLM error: {e}")
             sys.exit(1)
     
-    def execute_multi_step_plan(self, plan_json):
-        """Execute a multi-step plan"""
-        try:
-            steps = json.loads(plan_json)
-            if not isinstance(steps, list):
-                print("❌ Invalid plan format")
-                return False
-                
-            print(f"\n📋 Executing {len(steps)} steps:")
-            
-            for i, step in enumerate(steps, 1):
-                print(f"\n--- Step {i}: {step.get('description', 'Unknown')} ---")
-                if 'explanation' in step:
-                    print(f"💡 {step['explanation']}")
-                
-                command = step.get('command', '')
-                if not command:
-                    print("❌ No command specified for this step")
-                    continue
-                
-                print(f"🤖 Command: {command}")
-                response = input("🚀 Execute this step? [y/N/s] (s=skip): ").lower()
-                
-                if response == 's':
-                    print("⏭️ Skipping step")
-                    continue
-                elif response == 'y':
-                    try:
-                        result = subprocess.run(command, shell=True, capture_output=True, text=True)
-                        if result.stdout:
-                            print(f"📤 Output: {result.stdout}")
-                        if result.stderr:
-                            print(f"⚠️ Errors: {result.stderr}")
-                        if result.returncode != 0:
-                            print(f"❌ Step failed with exit code {result.returncode}")
-                            retry = input("🔄 Retry this step? [y/N]: ").lower()
-                            if retry == 'y':
-                                i -= 1  # Retry this step
-                                continue
-                    except Exception as e:
-                        print(f"❌ Error executing command: {e}")
-                else:
-                    print("⏭️ Skipping step")
-            
-            return True
-            
-        except json.JSONDecodeError:
-            print("❌ Invalid JSON in plan")
+    def _reusable(self, match):
+        """Whether a past command can be offered here without asking the model"""
+        if match.cwd and cwd_class(match.cwd) != cwd_class():
             return False
-        except Exception as e:
-            print(f"❌ Error executing plan: {e}")
-            return False 
\ No newline at end of file
+        return not self.validate_command(match.command)
+    
+    def validate_command(self, command, path=None, shell=None):
+        """Local problems with a generated command (syntax, unknown programs) for a PATH and shell,
+        by default the current ones"""
+        try:
+            available = self.path_index.commands(path)
+        except Exception:
+            available = None
+        return check_command(command, available=available, shell=shell)
+    
+    def completion_request(self, messages, mode="command", model=None):
+        """Keyword arguments for a chat completion in this mode"""
+        return dict(
+            model=model or self.backend.model,
+            messages=messages,
+            temperature=0.1,
+            max_tokens=500 if mode == "command" else 1000
+        )
+    
+    def _stream_completion(self, request, on_token=None):
+        """Run a streaming completion; return the text and when its first token arrived"""
+        first_token_at = None
+        parts = []
+        self.last_usage = None
+        if self.backend.stream_usage:
+            request = dict(request, stream_options={"include_usage": True})
+        for chunk in self.client.chat.completions.create(stream=True, **request):
+            if getattr(chunk, "usage", None):
+                self.last_usage = _usage_dict(chunk.usage)
+            if not chunk.choices:
+                continue
+            text = chunk.choices[0].delta.content
+            if not text:
+                continue
+            if first_token_at is None:
+                first_token_at = time.monotonic()
+            parts.append(text)
+            if on_token:
+                on_token(text)
+        return "".join(parts).strip(), first_token_at
+    
+    def execute_multi_step_plan(self, plan_json):
+        """Execute a multi-step plan, running independent steps concurrently"""
+        return execute_plan(plan_json, **plan_options(self.config))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+LLM backend settings for SudoThink
+
+Any OpenAI-compatible server can answer queries: the base URL, model and
+client options come from the "backend" setting in config.json, overridden by
+SUDOTHINK_BASE_URL, SUDOTHINK_MODEL and SUDOTHINK_TIMEOUT. Pointing the base
+URL at `sudothink fake-server` runs everything offline; its answers are kept
+apart from the real interaction log, context and response cache.
+"""
+
+import os
+from urllib.parse import urlparse
+
+DEFAULT_MODEL = "gpt-4"
+
+# Idle connections are kept this long so follow-up requests skip the TLS handshake
+KEEPALIVE_SECONDS = 120
+
+# Sent as the key when a custom server needs none
+PLACEHOLDER_API_KEY = "sk-no-key-required"
+
+# API path `sudothink fake-server` advertises, so its runs can be told apart
+FAKE_API_PATH = "/fake/v1"
+
+_ENV = {
+    "base_url": "SUDOTHINK_BASE_URL",
+    "model": "SUDOTHINK_MODEL",
+    "timeout": "SUDOTHINK_TIMEOUT",
+}
+
+
+def _keepalive_http_client():
+    """HTTP client that keeps idle connections open between requests"""
+    try:
+        import httpx
+    except ImportError:
+        return None
+    return httpx.Client(limits=httpx.Limits(
+        max_connections=100, max_keepalive_connections=20, keepalive_expiry=KEEPALIVE_SECONDS
+    ))
+
+
+def backend_settings(config):
+    """Backend options from config.json, with environment overrides"""
+    settings = dict(config.get_setting("backend", None) or {})
+    for name, variable in _ENV.items():
+        if os.getenv(variable):
+            settings[name] = os.getenv(variable)
+    if settings.get("timeout") is not None:
+        settings["timeout"] = float(settings["timeout"])
+    return settings
+
+
+def data_dir(config, backend):
+    """Directory for interactions, context and cached responses; a separate one for the fake server"""
+    if not backend.fake:
+        return config.config_dir
+    directory = config.config_dir / "fake"
+    directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+    return directory
+
+
+class Backend:
+    """An OpenAI-compatible endpoint: where to send requests and which model to ask"""
+
+    def __init__(self, api_key=None, base_url=None, model=None, timeout=None, max_retries=None,
+                 default_headers=None, stream_usage=True, multiple_choices=True):
+        self.api_key = api_key or (PLACEHOLDER_API_KEY if base_url else None)
+        self.base_url = base_url
+        self.model = model or DEFAULT_MODEL
+        self.model_configured = model is not None
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.default_headers = default_headers
+        # Ask for token usage at the end of streams; some servers reject the option
+        self.stream_usage = stream_usage
+        # Whether the server honours `n`; if not, candidates are separate requests
+        self.multiple_choices = multiple_choices
+        self._client = None
+
+    @property
+    def fake(self):
+        """Whether requests go to `sudothink fake-server` rather than a real model"""
+        return bool(self.base_url) and urlparse(self.base_url).path.rstrip("/").endswith(FAKE_API_PATH)
+
+    @classmethod
+    def from_config(cls, config):
+        settings = backend_settings(config)
+        return cls(
+            api_key=config.get_api_key(),
+            base_url=settings.get("base_url"),
+            model=settings.get("model"),
+            timeout=settings.get("timeout"),
+            max_retries=settings.get("max_retries"),
+            default_headers=settings.get("headers"),
+            stream_usage=settings.get("stream_usage", True),
+            multiple_choices=settings.get("multiple_choices", True),
+        )
+
+    @property
+    def client(self):
+        """OpenAI client, created on first use so the SDK import is deferred"""
+        if self._client is None:
+            from openai import OpenAI
+            options = {"api_key": self.api_key, "http_client": _keepalive_http_client()}
+            if self.base_url:
+                options["base_url"] = self.base_url
+            if self.timeout is not None:
+                options["timeout"] = self.timeout
+            if self.max_retries is not None:
+                options["max_retries"] = self.max_retries
+            if self.default_headers:
+                options["default_headers"] = self.default_headers
+            self._client = OpenAI(**options)
+        return self._client
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Batch mode for SudoThink
+
+Reads queries (plain lines or JSON objects) from a file or stdin, collects
+context once for the whole batch and sends the queries concurrently with a
+bounded number in flight. A 429 response pauses every worker for the
+server's Retry-After before retrying. Results are written as JSON lines in the
+order they complete.
+"""
+
+import sys
+import json
+import time
+import sqlite3
+import threading
+from email.utils import parsedate_to_datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from .cache import cache_key, context_fingerprint
+
+DEFAULT_CONCURRENCY = 4
+# Attempts per query after rate limiting before it is reported as failed
+MAX_RETRIES = 5
+# Longest wait between attempts when the server doesn't say
+MAX_BACKOFF = 30
+
+MODES = ["command", "plan", "explain"]
+
+
+def parse_queries(lines, default_mode="command"):
+    """Batch items from input lines: JSON objects with a "query", or plain text"""
+    items = []
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+        item = None
+        if line.startswith("{"):
+            try:
+                item = json.loads(line)
+            except ValueError:
+                item = None
+        if not isinstance(item, dict) or not item.get("query"):
+            item = {"query": line}
+        item.setdefault("mode", default_mode)
+        if item["mode"] not in MODES:
+            item["mode"] = default_mode
+        item["index"] = len(items)
+        items.append(item)
+    return items
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, from a rate-limit error's headers"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0)
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryGate:
+    """Shared pause: once one request is rate limited, no worker sends until it lifts"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.resume_at = 0
+
+    def pause(self, seconds):
+        with self.lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+    def wait(self):
+        while True:
+            with self.lock:
+                delay = self.resume_at - time.monotonic()
+            if delay <= 0:
+                return
+            time.sleep(delay)
+
+
+class BatchRunner:
+    def __init__(self, assistant, concurrency=DEFAULT_CONCURRENCY, use_cache=True, max_retries=MAX_RETRIES):
+        self.assistant = assistant
+        self.concurrency = max(1, concurrency)
+        self.use_cache = use_cache
+        self.max_retries = max_retries
+        self.gate = RetryGate()
+        self.stopped = threading.Event()
+        self.collection = None
+        self.fingerprint = None
+        # Rate limiting is handled here, across all workers
+        self.client = assistant.client.with_options(max_retries=0)
+
+    def _create(self, request):
+        from openai import RateLimitError
+
+        for attempt in range(self.max_retries + 1):
+            self.gate.wait()
+            try:
+                return self.client.chat.completions.create(**request)
+            except RateLimitError as e:
+                if attempt == self.max_retries:
+                    raise
+                self.gate.pause(retry_after(e) or min(2 ** attempt, MAX_BACKOFF))
+
+    def run_item(self, item):
+        """Answer one batch item; returns the result record"""
+        started = time.monotonic()
+        query, mode = item["query"], item["mode"]
+        record = {"index": item["index"], "query": query, "mode": mode}
+        if "id" in item:
+            record["id"] = item["id"]
+        if self.stopped.is_set():
+            record["error"] = "batch stopped"
+            return record
+
+        key = cache_key(query, mode, self.fingerprint)
+        cached = None
+        if self.use_cache:
+            try:
+                cached = self.assistant.response_cache.get(key)
+            except sqlite3.Error:
+                pass
+
+        if cached is not None:
+            record["response"] = cached
+            record["cached"] = True
+        else:
+            messages, _ = self.assistant.build_messages(query, mode, self.collection)
+            model = self.assistant.router.route(query, mode)
+            response = self._create(self.assistant.completion_request(messages, mode, model))
+            record["response"] = response.choices[0].message.content.strip()
+            record["cached"] = False
+            if self.use_cache:
+                try:
+                    self.assistant.response_cache.put(key, query, mode, record["response"])
+                except sqlite3.Error:
+                    pass
+
+        self.assistant.log_interaction(query, record["response"], mode=mode)
+        record["elapsed"] = round(time.monotonic() - started, 3)
+        return record
+
+    def run(self, items, out=None):
+        """Run every item, writing each result as a JSON line; return the number that failed"""
+        from openai import AuthenticationError
+
+        out = out or sys.stdout
+        # Context is the same for the whole batch, so collect it once
+        self.collection = self.assistant.collect_context()
+        self.fingerprint = context_fingerprint(backend=self.assistant.backend)
+        failed = 0
+
+        with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+            futures = {pool.submit(self.run_item, item): item for item in items}
+            for future in as_completed(futures):
+                item = futures[future]
+                try:
+                    record = future.result()
+                except AuthenticationError:
+                    # Every other request would fail the same way
+                    self.stopped.set()
+                    record = {"index": item["index"], "query": item["query"], "mode": item["mode"],
+                              "error": "Invalid OpenAI API key"}
+                except Exception as e:
+                    record = {"index": item["index"], "query": item["query"], "mode": item["mode"],
+                              "error": str(e)}
+                if "id" in item:
+                    record.setdefault("id", item["id"])
+                if "error" in record:
+                    failed += 1
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+        return failed
+
+
+def main():
+    """Entry point for `sudothink batch`"""
+    import argparse
+    from .assistant import AITerminalAssistant
+
+    parser = argparse.ArgumentParser(
+        prog="sudothink batch",
+        description="Answer many queries concurrently, writing JSON lines as they complete"
+    )
+    parser.add_argument("input", help="File with one query per line (plain text or JSON), or - for stdin")
+    parser.add_argument("--mode", choices=MODES, default="command", help="Mode for items that don't set one")
+    parser.add_argument("-j", "--concurrency", type=int, help="Queries in flight at once (default 4)")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    args = parser.parse_args()
+
+    try:
+        if args.input == "-":
+            items = parse_queries(sys.stdin, args.mode)
+        else:
+            with open(args.input, 'r') as f:
+                items = parse_queries(f, args.mode)
+    except OSError as e:
+        print(f"❌ Cannot read {args.input}: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    assistant = AITerminalAssistant()
+    concurrency = args.concurrency or assistant.config.get_setting("batch_concurrency", DEFAULT_CONCURRENCY)
+    runner = BatchRunner(assistant, concurrency=concurrency, use_cache=not args.no_cache)
+    failed = runner.run(items)
+    if failed:
+        print(f"❌ {failed} of {len(items)} queries failed", file=sys.stderr)
+        sys.exit(1)
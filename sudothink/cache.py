@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+Local response cache for SudoThink
+
+Responses are stored in SQLite keyed on the normalized query, the mode and a
+coarse fingerprint of the system context, so repeated questions are answered
+without a round trip.
+"""
+
+import os
+import re
+import json
+import time
+import sqlite3
+import hashlib
+import platform
+import contextlib
+from pathlib import Path
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 1000
+
+# Marker files that classify the working directory
+_PROJECT_MARKERS = [
+    ("python-project", ("pyproject.toml", "setup.py", "requirements.txt")),
+    ("node-project", ("package.json",)),
+    ("rust-project", ("Cargo.toml",)),
+    ("go-project", ("go.mod",)),
+    ("git-repo", (".git",)),
+]
+
+
+def normalize_query(query):
+    """Lowercase, collapse whitespace and drop trailing punctuation"""
+    query = re.sub(r"\s+", " ", query.strip().lower())
+    return query.rstrip(" ?!.")
+
+
+def cwd_class(cwd=None):
+    """Coarse class of the working directory (not the path itself)"""
+    cwd = cwd or os.getcwd()
+    if cwd == os.path.expanduser("~"):
+        return "home"
+    for name, markers in _PROJECT_MARKERS:
+        if any(os.path.exists(os.path.join(cwd, marker)) for marker in markers):
+            return name
+    if cwd.startswith("/tmp"):
+        return "tmp"
+    return "other"
+
+
+def context_fingerprint(cwd=None, backend=None):
+    """Parts of the system context, and the backend, that change what a good answer looks like"""
+    fingerprint = {
+        "os": platform.system(),
+        "shell": os.path.basename(os.getenv("SHELL", "unknown")),
+        "cwd_class": cwd_class(cwd),
+    }
+    if backend is not None:
+        # One server's or model's answers are not another's
+        fingerprint["backend"] = [backend.base_url, backend.model]
+    return fingerprint
+
+
+def cache_key(query, mode, fingerprint):
+    payload = json.dumps([normalize_query(query), mode, fingerprint], sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    def __init__(self, db_path=None, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.db_path = Path(db_path or Path.home() / ".sudothink" / "response_cache.db")
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=5)
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    query TEXT NOT NULL,
+                    mode TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    last_used REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used);
+                CREATE TABLE IF NOT EXISTS counters (
+                    name TEXT PRIMARY KEY,
+                    value INTEGER NOT NULL
+                );
+            """)
+            self._initialized = True
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _count(conn, name):
+        conn.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) "
+            "ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,)
+        )
+
+    def get(self, key):
+        """Return the cached response for key, or None on a miss"""
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row is None:
+                self._count(conn, "misses")
+                return None
+            conn.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?", (now, key))
+            self._count(conn, "hits")
+            return row[0]
+
+    def put(self, key, query, mode, response):
+        """Store a response and evict the least recently used entries beyond the cap"""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, query, mode, response, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, query, mode, response, now, now)
+            )
+            conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def invalidate(self, key):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM responses")
+            conn.execute("DELETE FROM counters")
+
+    def stats(self):
+        with self._transaction() as conn:
+            counters = dict(conn.execute("SELECT name, value FROM counters").fetchall())
+            entries = conn.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        return {"entries": entries, "hits": counters.get("hits", 0), "misses": counters.get("misses", 0)}
+
+
+def main():
+    """Entry point for `sudothink cache`"""
+    import argparse
+    from .config import Config
+    from .backend import Backend, data_dir
+
+    parser = argparse.ArgumentParser(prog="sudothink cache", description="Manage the SudoThink response cache")
+    parser.add_argument("--clear", action="store_true", help="Remove all cached responses and counters")
+    parser.add_argument("--invalidate", metavar="QUERY", help="Drop the cached response for a query")
+    parser.add_argument("--mode", default="command", help="Mode of the query to invalidate")
+
+    args = parser.parse_args()
+    config = Config()
+    backend = Backend.from_config(config)
+    cache = ResponseCache(data_dir(config, backend) / "response_cache.db")
+
+    if args.invalidate:
+        cache.invalidate(cache_key(args.invalidate, args.mode, context_fingerprint(backend=backend)))
+        print("✅ Cached response removed")
+        return
+
+    if args.clear:
+        cache.clear()
+        print("✅ Response cache cleared")
+        return
+
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    hit_rate = f"{100 * stats['hits'] / lookups:.0f}%" if lookups else "n/a"
+    print(f"📦 Cached responses: {stats['entries']}")
+    print(f"🎯 Hits: {stats['hits']}  Misses: {stats['misses']}  Hit rate: {hit_rate}")
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Multi-candidate command generation
+
+With `command_candidates` above 1, a command request asks for several answers
+at a higher temperature, in one request (`n`) or as concurrent requests for
+backends that only return one choice. Candidates are checked locally as they
+arrive and the first that passes is used, so a typo or a missing program is
+caught before the command is shown.
+"""
+
+import queue
+import threading
+
+DEFAULT_CANDIDATES = 1
+# Enough variety that candidates differ
+CANDIDATE_TEMPERATURE = 0.7
+
+
+def _text(response):
+    return [(choice.message.content or "").strip() for choice in response.choices]
+
+
+def _concurrent(client, request, count):
+    """Yield responses to count identical requests in the order they finish"""
+    results = queue.Queue()
+
+    def send():
+        try:
+            results.put((client.chat.completions.create(**request), None))
+        except Exception as e:
+            results.put((None, e))
+
+    # Daemon threads: once a candidate passes, the rest must not hold up exit
+    for _ in range(count):
+        threading.Thread(target=send, daemon=True).start()
+    error = None
+    for _ in range(count):
+        response, e = results.get()
+        if e is not None:
+            error = error or e
+            continue
+        yield response
+    if error is not None:
+        raise error
+
+
+def generate_candidates(client, request, count, check, multiple_choices=True):
+    """(command, problems, usages) for the first candidate check() finds no problems in
+
+    check(command) returns a list of problems. If every candidate has some, the
+    first candidate is returned with its problems. usages holds the usage of
+    every response read.
+    """
+    if count > 1:
+        request = dict(request, temperature=CANDIDATE_TEMPERATURE)
+    if count > 1 and not multiple_choices:
+        responses = _concurrent(client, request, count)
+    else:
+        if count > 1:
+            request = dict(request, n=count)
+        responses = iter([client.chat.completions.create(**request)])
+
+    first = None
+    usages = []
+    try:
+        for response in responses:
+            usages.append(getattr(response, "usage", None))
+            for command in _text(response):
+                problems = check(command)
+                if not problems:
+                    return command, [], usages
+                if first is None:
+                    first = (command, problems)
+    except Exception:
+        if first is None:
+            raise
+    if first is None:
+        return "", ["empty command"], usages
+    return first[0], first[1], usages
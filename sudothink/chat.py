@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Interactive chat mode for SudoThink
+
+One process, one OpenAI client and one conversation: follow-up turns reuse the
+warm connection and the message history, and context is only re-collected
+when the working directory or shell history changes.
+"""
+
+import os
+import sys
+import subprocess
+from .assistant import AITerminalAssistant, MODE_TASKS
+from .history import history_files
+from .plan import StreamingPlanParser, format_step
+
+# Conversation turns (user + assistant messages) kept in the prompt
+MAX_TURNS = 10
+
+CHAT_HELP = """Available commands:
+  exit - Exit chat mode
+  help - Show this help
+  setup - Configure API key
+  plan <task> - Generate a plan for a task
+  explain <task> - Explain a task"""
+
+
+def _print_token(text):
+    print(text, end="", flush=True)
+
+
+def _print_steps(parser, text):
+    for step in parser.feed(text):
+        print(format_step(step, len(parser.steps)), flush=True)
+
+
+class ChatSession:
+    def __init__(self, assistant=None):
+        self.assistant = assistant or AITerminalAssistant()
+        # Mode instructions vary per turn, so only the mode-independent prefix is static
+        self.system_prompt = "\n\n".join(text.strip() for text in self.assistant.static_prompt())
+        self.context_message = None
+        self.turns = []
+        self._context_key = None
+
+    def _context_key_now(self):
+        """What the context depends on: the cwd and the state of the history file"""
+        key = [os.getcwd()]
+        for hist_file in history_files():
+            try:
+                st = os.stat(hist_file)
+            except OSError:
+                continue
+            key += [hist_file, st.st_mtime_ns, st.st_size]
+            break
+        return key
+
+    def refresh_context(self, force=False, collection=None):
+        """Re-collect context only if it could have changed; return True if it did
+
+        A collection the assistant already has can be passed in to skip collecting.
+        """
+        key = self._context_key_now()
+        if not force and key == self._context_key:
+            return False
+        self._context_key = key
+        self.context_message = {"role": "user", "content": self.assistant.build_context_prompt(collection)}
+        return True
+
+    def messages(self, request):
+        history = [message for turn in self.turns[-MAX_TURNS:] for message in turn]
+        return [
+            {"role": "system", "content": self.system_prompt},
+            self.context_message,
+            {"role": "assistant", "content": "Understood. I will use this context."},
+        ] + history + [request]
+
+    def request(self, query, mode="command"):
+        return {"role": "user", "content": f"USER REQUEST: {query}\n\n{MODE_TASKS.get(mode, '')}"}
+
+    def ask(self, query, mode="command", on_token=None):
+        """Send one turn and remember it; streams through on_token if given"""
+        self.refresh_context()
+        reply = self.send(self.request(query, mode), mode, self.assistant.router.route(query, mode), on_token)
+        self.assistant.log_interaction(query, reply, mode=mode)
+        return reply
+
+    def send(self, request, mode="command", model=None, on_token=None):
+        """Send one user message after the conversation so far and remember the turn"""
+        if self.context_message is None:
+            self.refresh_context()
+        completion = self.assistant.completion_request(self.messages(request), mode, model)
+        reply, _ = self.assistant._stream_completion(completion, on_token)
+        self.turns.append([request, {"role": "assistant", "content": reply}])
+        return reply
+
+    def remember(self, query, reply, mode="command", collection=None):
+        """Add a turn answered some other way (cache, history) to the conversation"""
+        if self.context_message is None:
+            self.refresh_context(collection=collection)
+        self.turns.append([self.request(query, mode), {"role": "assistant", "content": reply}])
+
+    def run_command(self, command):
+        """Run a suggested command; `cd` is applied to the chat itself"""
+        if command.startswith("cd ") and "&&" not in command and ";" not in command:
+            target = os.path.expanduser(command[3:].strip().strip("'\""))
+            try:
+                os.chdir(target)
+            except OSError as e:
+                print(f"❌ {e}")
+            return
+        subprocess.run(command, shell=True)
+
+
+def main():
+    """Entry point for `sudothink chat`"""
+    try:
+        import readline  # noqa: F401 - line editing for input()
+    except ImportError:
+        pass
+
+    from openai import AuthenticationError
+
+    print("💬 AI Terminal Chat Mode")
+    print("Type 'exit' to quit, 'help' for commands")
+    session = ChatSession()
+
+    while True:
+        try:
+            user_input = input("\n🤖 You: ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print("\n👋 Goodbye!")
+            break
+
+        if not user_input:
+            continue
+        if user_input == "exit":
+            print("👋 Goodbye!")
+            break
+        if user_input == "help":
+            print(CHAT_HELP)
+            continue
+        if user_input == "setup":
+            from .setup import main as setup_main
+            sys.argv = [sys.argv[0]]
+            setup_main()
+            continue
+
+        mode = "command"
+        for prefix in ("plan", "explain"):
+            if user_input.startswith(prefix + " "):
+                mode = prefix
+                user_input = user_input[len(prefix) + 1:]
+
+        try:
+            if mode == "command":
+                command = session.ask(user_input, mode)
+                print(f"\n🤖 Suggested command:\n{command}")
+                if input("\n🚀 Run this command? [y/N]: ").lower() == "y":
+                    session.run_command(command)
+            else:
+                print("\n📋 Plan:" if mode == "plan" else "\n💡 Analysis:")
+                if mode == "plan":
+                    parser = StreamingPlanParser()
+                    reply = session.ask(user_input, mode, on_token=lambda text: _print_steps(parser, text))
+                    if not parser.finished or parser.invalid:
+                        print(f"⚠️ The response is not a complete plan:\n{reply}")
+                    elif input("\n🚀 Execute this plan? [y/N]: ").lower() == "y":
+                        session.assistant.execute_multi_step_plan(reply)
+                else:
+                    session.ask(user_input, mode, on_token=_print_token)
+                    print()
+        except AuthenticationError:
+            print("❌ Invalid OpenAI API key. Please check OPENAI_API_KEY.")
+            break
+        except KeyboardInterrupt:
+            print("\n⏹️ Cancelled")
+        except Exception as e:
+            print(f"❌ LLM error: {e}")
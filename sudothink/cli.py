@@ -4,9 +4,53 @@ Command-line interface for SudoThink
 """
 
 import sys
-import argparse
-from .assistant import AITerminalAssistant
-from .setup import main as setup_main
+
+# Subcommands are imported on demand so each path loads only what it needs
+
+# Flags accepted anywhere in a query invocation
+QUERY_FLAGS = ["--no-cache", "--refresh", "--stream", "--no-stream", "--ttft", "--prompt-tokens", "--timings",
+               "--escalate"]
+
+def _print_token(text):
+    print(text, end="", flush=True)
+
+def _print_ttft(assistant):
+    metrics = assistant.last_metrics
+    if metrics:
+        print(f"⏱️ First token: {metrics['ttft'] * 1000:.0f} ms, total: {metrics['total'] * 1000:.0f} ms",
+              file=sys.stderr)
+
+def _print_prompt_tokens(assistant):
+    report = assistant.last_metrics.get("prompt_tokens")
+    if not report:
+        print("ℹ️ No prompt was sent (cached response)", file=sys.stderr)
+        return
+    print("🧮 Prompt tokens: " + ", ".join(f"{name}={tokens}" for name, tokens in report.items()),
+          file=sys.stderr)
+
+def _record_timings(timings, assistant, mode, show, via_daemon):
+    """Print and/or append this query's timings, including the assistant's own spans"""
+    from .config import Config
+    from .timing import format_timings, metrics_path, append_metrics
+    
+    metrics = assistant.last_metrics or {}
+    timings.update({name: ms / 1000 for name, ms in (metrics.get("timings") or {}).items()}, prefix="generate.")
+    spans = timings.as_ms()
+    if show:
+        format_timings(spans)
+        if metrics.get("usage"):
+            print("🧮 Tokens: " + ", ".join(f"{name}={count}" for name, count in metrics["usage"].items()),
+                  file=sys.stderr)
+    path = metrics_path(Config())
+    if path:
+        append_metrics(path, {
+            "mode": mode,
+            "cached": metrics.get("cached", False),
+            "model": metrics.get("model"),
+            "daemon": via_daemon,
+            "spans": spans,
+            "usage": metrics.get("usage"),
+        })
 
 def main():
     """Main CLI entry point"""
@@ -14,9 +58,83 @@ def main():
     if len(sys.argv) > 1 and sys.argv[1] == "setup":
         # Remove 'setup' from argv and pass to setup module
         sys.argv.pop(1)
+        from .setup import main as setup_main
         setup_main()
         return
     
+    # Check for daemon command
+    if len(sys.argv) > 1 and sys.argv[1] == "daemon":
+        sys.argv.pop(1)
+        from .daemon import main as daemon_main
+        daemon_main()
+        return
+    
+    # Check for chat command
+    if len(sys.argv) > 1 and sys.argv[1] == "chat":
+        from .chat import main as chat_main
+        chat_main()
+        return
+    
+    # Check for run command
+    if len(sys.argv) > 1 and sys.argv[1] == "run":
+        sys.argv.pop(1)
+        from .run import main as run_main
+        run_main()
+        return
+    
+    # Check for history command
+    if len(sys.argv) > 1 and sys.argv[1] == "history":
+        sys.argv.pop(1)
+        from .interactions import main as history_main
+        history_main()
+        return
+    
+    # Check for cache command
+    if len(sys.argv) > 1 and sys.argv[1] == "cache":
+        sys.argv.pop(1)
+        from .cache import main as cache_main
+        cache_main()
+        return
+    
+    # Check for batch command
+    if len(sys.argv) > 1 and sys.argv[1] == "batch":
+        sys.argv.pop(1)
+        from .batch import main as batch_main
+        batch_main()
+        return
+    
+    # Check for metrics command
+    if len(sys.argv) > 1 and sys.argv[1] == "metrics":
+        sys.argv.pop(1)
+        from .timing import main as metrics_main
+        metrics_main()
+        return
+    
+    # Check for prefetch command (run in the background by the ai.zsh hooks)
+    if len(sys.argv) > 1 and sys.argv[1] == "prefetch":
+        from .prefetch import main as prefetch_main
+        prefetch_main()
+        return
+    
+    # Check for man-index command
+    if len(sys.argv) > 1 and sys.argv[1] == "man-index":
+        sys.argv.pop(1)
+        from .manindex import main as manindex_main
+        manindex_main()
+        return
+    
+    # Check for fake-server command
+    if len(sys.argv) > 1 and sys.argv[1] == "fake-server":
+        sys.argv.pop(1)
+        from .fakeserver import main as fakeserver_main
+        fakeserver_main()
+        return
+    
+    # Report per-module import cost of each entry path
+    if len(sys.argv) > 1 and sys.argv[1] == "--startup-profile":
+        from .startup import report
+        sys.exit(0 if report() else 1)
+    
     # Check for help on setup
     if len(sys.argv) > 1 and sys.argv[1] in ["--help", "-h"]:
         print("SudoThink - AI Terminal Assistant")
@@ -25,22 +143,68 @@ def main():
         print("  sudothink setup              - Configure API key")
         print("  sudothink setup --status     - Show configuration status")
         print("  sudothink setup --remove     - Remove stored API key")
+        print("  sudothink daemon             - Run the warm background daemon")
+        print("  sudothink daemon --status    - Show whether the daemon is running")
+        print("  sudothink daemon --stop      - Stop the daemon")
+        print("  sudothink chat               - Interactive chat with conversation memory")
+        print("  sudothink run <query>        - Suggest, run and correct a command in one conversation")
+        print("  sudothink history search     - Search past interactions (--mode, --failed, --since 7d)")
+        print("  sudothink cache              - Show response cache statistics")
+        print("  sudothink cache --clear      - Empty the response cache")
+        print("  sudothink batch <file|->     - Answer queries concurrently, JSON lines out")
+        print("  sudothink metrics            - p50/p95 per phase from the metrics file")
+        print("  sudothink man-index [cmd]    - Show the local manual index, or index one program")
+        print("  sudothink fake-server        - Local OpenAI-compatible stand-in for offline runs")
+        print("  sudothink --startup-profile  - Report import time per module")
         print("\nModes: command (default), plan, explain")
+        print("\nOptions:")
+        print("  --no-cache                   - Bypass the response cache")
+        print("  --refresh                    - Replace the cached response for this query")
+        print("  --stream / --no-stream       - Render plan and explain output as it arrives")
+        print("                                 (default: on when writing to a terminal)")
+        print("  --ttft                       - Report time to first token")
+        print("  --prompt-tokens              - Report prompt tokens per context section")
+        print("  --timings                    - Report time spent in each phase")
+        print("  --escalate                   - Use the most capable model (e.g. after a failed command)")
         return
     
-    if len(sys.argv) < 2:
+    args = [arg for arg in sys.argv[1:] if arg not in QUERY_FLAGS]
+    use_cache = "--no-cache" not in sys.argv
+    refresh = "--refresh" in sys.argv
+    stream = "--stream" in sys.argv or ("--no-stream" not in sys.argv and sys.stdout.isatty())
+    show_ttft = "--ttft" in sys.argv
+    show_prompt_tokens = "--prompt-tokens" in sys.argv
+    show_timings = "--timings" in sys.argv
+    escalate = "--escalate" in sys.argv
+    
+    from .timing import Timings, process_uptime
+    timings = Timings()
+    uptime = process_uptime()
+    if uptime is not None:
+        timings.add("startup", uptime)
+    
+    if len(args) < 1:
         print("❌ Usage: sudothink <query> [mode]")
         print("Modes: command (default), plan, explain")
         print("Run 'sudothink setup' to configure your API key")
         sys.exit(1)
     
-    query = " ".join(sys.argv[1:-1]) if len(sys.argv) > 2 else " ".join(sys.argv[1:])
-    mode = sys.argv[-1] if len(sys.argv) > 2 and sys.argv[-1] in ["command", "plan", "explain"] else "command"
+    query = " ".join(args[:-1]) if len(args) > 1 else " ".join(args)
+    mode = args[-1] if len(args) > 1 and args[-1] in ["command", "plan", "explain"] else "command"
     
-    assistant = AITerminalAssistant()
+    # Prefer the warm daemon; fall back to an in-process assistant
+    with timings.span("connect"):
+        from .daemon import DaemonClient
+        assistant = DaemonClient.connect()
+    via_daemon = assistant is not None
+    if assistant is None:
+        with timings.span("assistant_init"):
+            from .assistant import AITerminalAssistant
+            assistant = AITerminalAssistant()
     
     # Analyze task complexity
-    is_complex = assistant.analyze_task_complexity(query)
+    with timings.span("complexity"):
+        is_complex = assistant.analyze_task_complexity(query)
     
     if is_complex and mode == "command":
         print("🤔 This appears to be a complex task. Consider using 'plan' mode for multi-step execution.")
@@ -49,21 +213,74 @@ def main():
             mode = "plan"
     
     if mode == "plan":
+        from .plan import StreamingPlanParser, format_step
         print("📋 Generating step-by-step plan...")
-        plan = assistant.generate_response(query, mode="plan")
-        print(f"\n📋 Plan:\n{plan}")
+        if stream:
+            print("\n📋 Plan:")
+            # Show each step as soon as it is complete instead of the raw JSON
+            parser = StreamingPlanParser()
+            
+            def show_steps(text):
+                for step in parser.feed(text):
+                    print(format_step(step, len(parser.steps)), flush=True)
+            
+            with timings.span("generate"):
+                plan = assistant.generate_response(query, mode="plan", use_cache=use_cache, refresh=refresh,
+                                                   escalate=escalate, stream=True, on_token=show_steps)
+            complete = parser.finished and not parser.invalid
+            if not complete:
+                print(f"⚠️ The response is not a complete plan:\n{plan}")
+        else:
+            with timings.span("generate"):
+                plan = assistant.generate_response(query, mode="plan", use_cache=use_cache, refresh=refresh,
+                                                   escalate=escalate)
+            print(f"\n📋 Plan:\n{plan}")
+            complete = True
+        if show_ttft:
+            _print_ttft(assistant)
+        _record_timings(timings, assistant, mode, show_timings, via_daemon)
         
+        if not complete:
+            sys.exit(1)
         response = input("\n🚀 Execute this plan? [y/N]: ").lower()
         if response == 'y':
             assistant.execute_multi_step_plan(plan)
     elif mode == "explain":
         print("💡 Analyzing request...")
-        explanation = assistant.generate_response(query, mode="explain")
-        print(f"\n💡 Analysis:\n{explanation}")
+        if stream:
+            print("\n💡 Analysis:")
+            with timings.span("generate"):
+                assistant.generate_response(query, mode="explain", use_cache=use_cache, refresh=refresh,
+                                            escalate=escalate, stream=True, on_token=_print_token)
+            print()
+        else:
+            with timings.span("generate"):
+                explanation = assistant.generate_response(query, mode="explain", use_cache=use_cache,
+                                                          refresh=refresh, escalate=escalate)
+            print(f"\n💡 Analysis:\n{explanation}")
+        if assistant.last_metrics.get("manual"):
+            print("📖 From the local manual (use --refresh to ask the model)", file=sys.stderr)
+        if show_ttft:
+            _print_ttft(assistant)
+        _record_timings(timings, assistant, mode, show_timings, via_daemon)
     else:
         # Default command mode
-        command = assistant.generate_response(query, mode="command")
+        with timings.span("generate"):
+            command = assistant.generate_response(query, mode="command", use_cache=use_cache, refresh=refresh,
+                                                  escalate=escalate)
         print(command)
+        retrieved = assistant.last_metrics.get("retrieved")
+        if retrieved:
+            print(f"📚 From a previous command that worked ({retrieved['confidence']:.0%} match: "
+                  f"\"{retrieved['query']}\")", file=sys.stderr)
+        for problem in assistant.last_metrics.get("problems") or []:
+            print(f"⚠️ {problem}", file=sys.stderr)
+        if show_ttft:
+            _print_ttft(assistant)
+        _record_timings(timings, assistant, mode, show_timings, via_daemon)
+    
+    if show_prompt_tokens:
+        _print_prompt_tokens(assistant)
 
 if __name__ == "__main__":
     main() 
\ No newline at end of file
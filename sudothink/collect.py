@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Concurrent context collection for SudoThink
+
+Runs each context collector on its own daemon thread with its own deadline.
+A collector that misses its deadline is replaced by its fallback value, so a
+slow filesystem cannot hold up the request (or the interpreter's exit). Its
+thread keeps running, but whatever it produces after the deadline is dropped,
+so it can't change a result that has already been returned.
+"""
+
+import time
+import threading
+
+# Seconds each collector may take before its fallback is used
+DEFAULT_DEADLINES = {
+    "available_commands": 0.5,
+    "directory_structure": 0.5,
+    "recent_commands": 0.3,
+    "previous_context": 0.3,
+}
+
+DEFAULT_DEADLINE = 0.5
+
+
+class CollectionResult:
+    def __init__(self):
+        self.values = {}
+        self.timed_out = []
+        self.failed = []
+        self.durations = {}
+        # Names whose values came from elsewhere (e.g. a prefetched snapshot)
+        self.prefetched = []
+
+    def __getitem__(self, name):
+        return self.values[name]
+
+
+def collect(collectors, deadlines=None, fallbacks=None):
+    """Run {name: callable} concurrently and return a CollectionResult"""
+    deadlines = dict(DEFAULT_DEADLINES, **(deadlines or {}))
+    fallbacks = fallbacks or {}
+    result = CollectionResult()
+    outcomes = {}
+    lock = threading.Lock()
+    # Names whose deadline has passed; their late outcomes are ignored
+    closed = set()
+    started = time.monotonic()
+
+    def run(name, func):
+        begin = time.monotonic()
+        try:
+            outcome = (True, func())
+        except Exception as e:
+            outcome = (False, e)
+        with lock:
+            if name in closed:
+                return
+            outcomes[name] = outcome
+            result.durations[name] = time.monotonic() - begin
+
+    threads = {}
+    for name, func in collectors.items():
+        thread = threading.Thread(target=run, args=(name, func), name=f"sudothink-{name}", daemon=True)
+        thread.start()
+        threads[name] = thread
+
+    for name, thread in threads.items():
+        remaining = deadlines.get(name, DEFAULT_DEADLINE) - (time.monotonic() - started)
+        thread.join(max(remaining, 0))
+
+        with lock:
+            closed.add(name)
+            outcome = outcomes.get(name)
+        if outcome is None:
+            result.timed_out.append(name)
+            result.values[name] = fallbacks.get(name)
+        elif not outcome[0]:
+            result.failed.append(name)
+            result.values[name] = fallbacks.get(name)
+        else:
+            result.values[name] = outcome[1]
+
+    return result
@@ -12,6 +12,7 @@ class Config:
     def __init__(self):
         self.config_dir = Path.home() / ".sudothink"
         self.config_file = self.config_dir / "config.json"
+        self._settings = None
         self._ensure_config_dir()
     
     def _ensure_config_dir(self):
@@ -87,6 +88,18 @@ class Config:
         
         return False
     
+    def get_setting(self, name, default=None):
+        """Get an optional setting from the config file"""
+        if self._settings is None:
+            self._settings = {}
+            if self.config_file.exists():
+                try:
+                    with open(self.config_file, 'r') as f:
+                        self._settings = json.load(f)
+                except (json.JSONDecodeError, IOError):
+                    pass
+        return self._settings.get(name, default)
+    
     def has_api_key(self):
         """Check if API key is configured"""
         return self.get_api_key() is not None 
\ No newline at end of file
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Bounded context store for SudoThink
+
+Context entries are appended as JSON lines under a lock, so concurrent shells
+never corrupt the file. When the file outgrows its caps it is compacted into a
+temporary file and atomically swapped in. Readers only parse the tail.
+"""
+
+import os
+import json
+import time
+import fcntl
+import tempfile
+import contextlib
+from pathlib import Path
+
+DEFAULT_MAX_ENTRIES = 200
+DEFAULT_MAX_BYTES = 256 * 1024
+
+
+class ContextStore:
+    def __init__(self, path=None, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = Path(path or Path.home() / ".sudothink" / "context.jsonl")
+        self.lock_path = self.path.with_suffix(".lock")
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    @contextlib.contextmanager
+    def _locked(self):
+        self.path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+        with open(self.lock_path, 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def append(self, entry):
+        """Add one entry; compacts the file once it is past twice its caps"""
+        entry = dict(entry, ts=entry.get("ts", time.time()))
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._locked():
+            with open(self.path, 'a') as f:
+                f.write(line)
+                size = f.tell()
+            if size > 2 * self.max_bytes:
+                self._compact()
+
+    def _compact(self):
+        """Rewrite the file with only the newest entries that fit the caps (lock held)"""
+        lines = self._tail_lines(self.max_bytes)[-self.max_entries:]
+        fd, tmp_path = tempfile.mkstemp(dir=str(self.path.parent), prefix=".context.")
+        with os.fdopen(fd, 'w') as f:
+            f.writelines(line + "\n" for line in lines)
+        os.replace(tmp_path, self.path)
+
+    def compact(self):
+        with self._locked():
+            if self.path.exists():
+                self._compact()
+
+    def _tail_lines(self, max_bytes):
+        """Complete lines from the last max_bytes of the file"""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                f.seek(max(size - max_bytes, 0))
+                data = f.read()
+        except OSError:
+            return []
+        lines = data.decode("utf-8", errors="ignore").split("\n")
+        if size > max_bytes:
+            lines = lines[1:]  # first line is partial
+        return [line for line in lines if line.strip()]
+
+    def load_recent(self, limit=5, cwd=None):
+        """The newest `limit` entries, oldest first, preferring entries from cwd"""
+        entries = []
+        for line in self._tail_lines(self.max_bytes):
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                continue  # a torn line from a crashed writer
+
+        if cwd is not None:
+            local = [entry for entry in entries if entry.get("cwd") == cwd]
+            others = [entry for entry in entries if entry.get("cwd") != cwd]
+            entries = (others[-max(limit - len(local), 0):] if len(local) < limit else []) + local[-limit:]
+            entries.sort(key=lambda entry: entry.get("ts", 0))
+        return entries[-limit:]
+
+    def import_legacy(self, json_file):
+        """One-time import of the old whole-file ~/.ai-terminal-context.json"""
+        try:
+            with open(json_file, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if data:
+            self.append({"summary": json.dumps(data)[:1000], "legacy": True})
+        os.replace(json_file, json_file + ".imported")
+        return True
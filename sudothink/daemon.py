@@ -0,0 +1,355 @@
+#!/usr/bin/env python3
+"""
+Warm background daemon for SudoThink
+
+Keeps one AITerminalAssistant (and its OpenAI client) alive behind a per-user
+Unix socket so each `ai` call skips the SDK import and client setup.
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import socket
+import threading
+import contextlib
+import socketserver
+from pathlib import Path
+
+CONNECT_TIMEOUT = 0.2
+REQUEST_TIMEOUT = 300
+# Seconds `--stop` waits for the socket to go away
+STOP_TIMEOUT = 5
+
+# Caller environment the daemon adopts per request: PATH decides which
+# commands exist, SHELL and HISTFILE which history is read
+CLIENT_ENVIRONMENT = ("PATH", "SHELL", "HISTFILE", "USER")
+
+
+def socket_path():
+    """Location of the daemon socket (inside the owner-only config dir)"""
+    override = os.getenv("SUDOTHINK_SOCKET")
+    if override:
+        return override
+    return str(Path.home() / ".sudothink" / "daemon.sock")
+
+
+def send_request(payload, timeout=REQUEST_TIMEOUT, path=None, on_token=None):
+    """Send one JSON request to the daemon and return the decoded reply
+    
+    Streamed tokens arrive as {"token": ...} lines before the reply and are
+    passed to on_token.
+    """
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path or socket_path())
+        sock.sendall((json.dumps(payload) + "\n").encode("utf-8"))
+        with sock.makefile("r", encoding="utf-8") as reader:
+            for line in reader:
+                message = json.loads(line)
+                if "token" not in message:
+                    return message
+                if on_token:
+                    on_token(message["token"])
+    finally:
+        sock.close()
+    raise ConnectionError("daemon closed the connection")
+
+
+class DaemonClient:
+    """Thin client exposing the assistant methods the CLI needs"""
+
+    def __init__(self, path=None):
+        self.path = path or socket_path()
+        self.last_metrics = {}
+
+    @classmethod
+    def connect(cls, path=None):
+        """Return a client if a daemon answers on the socket, else None"""
+        if os.getenv("SUDOTHINK_NO_DAEMON"):
+            return None
+        client = cls(path)
+        try:
+            reply = send_request({"action": "ping"}, timeout=CONNECT_TIMEOUT, path=client.path)
+        except (OSError, ValueError):
+            return None
+        return client if reply.get("ok") else None
+
+    def _call(self, payload, on_token=None):
+        try:
+            reply = send_request(payload, path=self.path, on_token=on_token)
+        except (OSError, ValueError) as e:
+            print(f"❌ Daemon error: {e}")
+            sys.exit(1)
+        if not reply.get("ok"):
+            print(reply.get("error") or "❌ Daemon request failed")
+            sys.exit(1)
+        self.last_metrics = reply.get("metrics", {})
+        return reply.get("result")
+
+    def analyze_task_complexity(self, query):
+        return self._call({"action": "complexity", "query": query})
+
+    def generate_response(self, query, context=None, mode="command", use_cache=True, refresh=False,
+                          stream=False, on_token=None, escalate=False):
+        return self._call({
+            "action": "generate",
+            "query": query,
+            "mode": mode,
+            "cwd": os.getcwd(),
+            "use_cache": use_cache,
+            "refresh": refresh,
+            "stream": stream,
+            "escalate": escalate,
+            "shell_pid": os.getenv("SUDOTHINK_SHELL_PID"),
+            "env": {name: os.environ.get(name) for name in CLIENT_ENVIRONMENT},
+        }, on_token=on_token)
+
+    def execute_multi_step_plan(self, plan_json):
+        """Plans run in the caller's terminal, not in the daemon"""
+        from .config import Config
+        from .plan import execute_plan, plan_options
+        return execute_plan(plan_json, **plan_options(Config()))
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line.decode("utf-8"))
+            reply = self.server.dispatch(request, self.send)
+        except Exception as e:
+            request = {}
+            reply = {"ok": False, "error": f"❌ Daemon error: {e}"}
+        self.send(reply)
+        if request.get("action") == "shutdown":
+            # Only once the reply is out, or the process may exit before sending it
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+    def send(self, message):
+        self.wfile.write((json.dumps(message) + "\n").encode("utf-8"))
+
+
+class AssistantDaemon(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """Unix socket server wrapping a single warm assistant"""
+
+    daemon_threads = True
+
+    def __init__(self, assistant, path=None):
+        self.assistant = assistant
+        self.path = path or socket_path()
+        # Generation switches the working directory and environment to the
+        # caller's until its context is collected; that part is serialized.
+        self.lock = threading.Lock()
+        _clear_stale_socket(self.path)
+        old_umask = os.umask(0o077)
+        try:
+            super().__init__(self.path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+
+    def dispatch(self, request, send):
+        action = request.get("action")
+        if action == "ping":
+            return {"ok": True, "pid": os.getpid()}
+        if action == "shutdown":
+            return {"ok": True}
+        if action == "complexity":
+            return {"ok": True, "result": self.assistant.analyze_task_complexity(request["query"])}
+        if action == "generate":
+            return self._generate(request, send)
+        return {"ok": False, "error": f"❌ Unknown daemon action: {action}"}
+
+    def _generate(self, request, send):
+        output = io.StringIO()
+        stream = request.get("stream", False)
+        self.lock.acquire()
+        held = True
+        previous_dir = os.getcwd()
+        previous_env = {name: os.environ.get(name) for name in CLIENT_ENVIRONMENT}
+
+        def release():
+            """Restore the daemon's cwd and environment and let the next request in"""
+            nonlocal held
+            if held:
+                held = False
+                os.chdir(previous_dir)
+                _apply_environment(previous_env)
+                self.lock.release()
+
+        try:
+            os.chdir(request.get("cwd") or previous_dir)
+            _apply_environment(request.get("env") or {})
+            self.assistant.shell_pid = request.get("shell_pid")
+            with _REQUEST_OUTPUT.capture(output):
+                # The network round trip runs after release(), alongside other requests
+                result = self.assistant.generate_response(
+                    request["query"],
+                    mode=request.get("mode", "command"),
+                    use_cache=request.get("use_cache", True),
+                    refresh=request.get("refresh", False),
+                    stream=stream,
+                    escalate=request.get("escalate", False),
+                    on_token=(lambda text: send({"token": text})) if stream else None,
+                    release=release
+                )
+            return {"ok": True, "result": result, "metrics": self.assistant.last_metrics}
+        except SystemExit:
+            # generate_response reports errors by printing and exiting
+            return {"ok": False, "error": output.getvalue().strip()}
+        finally:
+            release()
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+
+class _RequestOutput:
+    """Stands in for sys.stdout while requests run, giving each request thread its own buffer"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.active = 0
+        self.original = None
+
+    @contextlib.contextmanager
+    def capture(self, buffer):
+        with self.lock:
+            if not self.active:
+                self.original = sys.stdout
+                sys.stdout = self
+            self.active += 1
+        self.local.buffer = buffer
+        try:
+            yield buffer
+        finally:
+            self.local.buffer = None
+            with self.lock:
+                self.active -= 1
+                if not self.active:
+                    sys.stdout = self.original
+
+    def _target(self):
+        buffer = getattr(self.local, "buffer", None)
+        return self.original if buffer is None else buffer
+
+    def write(self, text):
+        return self._target().write(text)
+
+    def flush(self):
+        self._target().flush()
+
+
+_REQUEST_OUTPUT = _RequestOutput()
+
+
+def _apply_environment(values):
+    """Set (or, for None, unset) the given CLIENT_ENVIRONMENT variables"""
+    for name, value in values.items():
+        if name not in CLIENT_ENVIRONMENT:
+            continue
+        if value is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = value
+
+
+def _warm_client(assistant):
+    """Import the SDK and build the client now, so the first request doesn't pay for it"""
+    try:
+        assistant.client
+    except Exception:
+        pass  # reported properly when a request needs the client
+
+
+def _clear_stale_socket(path):
+    """Remove a socket left behind by a daemon that is no longer running"""
+    if not os.path.exists(path):
+        return
+    try:
+        send_request({"action": "ping"}, timeout=CONNECT_TIMEOUT, path=path)
+    except (OSError, ValueError):
+        os.unlink(path)
+        return
+    raise RuntimeError(f"a daemon is already listening on {path}")
+
+
+def _wait_for_exit(path, timeout=STOP_TIMEOUT):
+    """Whether the daemon on path stopped answering within timeout"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if not os.path.exists(path):
+            return True
+        try:
+            send_request({"action": "ping"}, timeout=CONNECT_TIMEOUT, path=path)
+        except (OSError, ValueError):
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def serve(path=None):
+    """Run the daemon in the foreground until stopped"""
+    from .assistant import AITerminalAssistant
+
+    assistant = AITerminalAssistant()
+    try:
+        server = AssistantDaemon(assistant, path)
+    except RuntimeError as e:
+        print(f"ℹ️ SudoThink daemon not started: {e}")
+        return
+    print(f"🔥 SudoThink daemon listening on {server.path} (pid {os.getpid()})")
+    threading.Thread(target=_warm_client, args=(assistant,), daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def main():
+    """Entry point for `sudothink daemon`"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="sudothink daemon", description="Run the SudoThink daemon")
+    parser.add_argument("--status", action="store_true", help="Show whether the daemon is running")
+    parser.add_argument("--stop", action="store_true", help="Stop a running daemon")
+    parser.add_argument("--socket", help="Socket path (default: ~/.sudothink/daemon.sock)")
+
+    args = parser.parse_args()
+    path = args.socket or socket_path()
+
+    if args.status or args.stop:
+        try:
+            reply = send_request({"action": "ping"}, timeout=CONNECT_TIMEOUT, path=path)
+        except (OSError, ValueError):
+            print("❌ SudoThink daemon is not running")
+            return
+        if args.stop:
+            try:
+                send_request({"action": "shutdown"}, timeout=CONNECT_TIMEOUT, path=path)
+            except (OSError, ValueError):
+                pass  # the daemon may close before replying; check the socket instead
+            if _wait_for_exit(path):
+                print("✅ SudoThink daemon stopped")
+            else:
+                print("❌ SudoThink daemon did not stop")
+        else:
+            print(f"✅ SudoThink daemon is running (pid {reply.get('pid')}) on {path}")
+        return
+
+    serve(path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Directory snapshot for SudoThink prompts
+
+Walks the working directory in-process with os.scandir, stops as soon as an
+entry or time budget is spent, and caches the result per directory keyed on
+the mtimes of the directories it walked.
+"""
+
+import os
+import json
+import time
+import tempfile
+from pathlib import Path
+
+# Directories that are never useful context and are often huge
+SKIP_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", "venv",
+    ".tox", ".nox", ".mypy_cache", ".pytest_cache", ".ruff_cache", ".cache",
+    ".idea", ".vscode", "dist", "build", "target", ".next", ".terraform",
+}
+
+# Directories that usually tell the model most about a project
+RELEVANT_DIRS = {
+    "src", "lib", "app", "tests", "test", "docs", "bin", "scripts", "config",
+    "cmd", "pkg", "internal", "include", "examples", "migrations", "deploy",
+}
+
+MAX_CACHED_DIRS = 64
+
+
+def _is_virtualenv(path):
+    return os.path.exists(os.path.join(path, "pyvenv.cfg"))
+
+
+def _relevance(relpath, depth):
+    """Lower sorts first: shallow, well-known and visible directories win"""
+    name = os.path.basename(relpath)
+    score = depth * 10
+    if name.lower() in RELEVANT_DIRS:
+        score -= 5
+    if name.startswith("."):
+        score += 5
+    return score
+
+
+class DirectorySnapshot:
+    def __init__(self, cache_file=None, max_entries=200, max_depth=2, time_budget=0.25, max_chars=1000):
+        self.cache_file = Path(cache_file or Path.home() / ".sudothink" / "dirtree_cache.json")
+        self.max_entries = max_entries
+        self.max_depth = max_depth
+        self.time_budget = time_budget
+        self.max_chars = max_chars
+
+    def _load_cache(self):
+        try:
+            with open(self.cache_file, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_cache(self, cache):
+        if len(cache) > MAX_CACHED_DIRS:
+            recent = sorted(cache.items(), key=lambda item: item[1].get("stored", 0))[-MAX_CACHED_DIRS:]
+            cache = dict(recent)
+        try:
+            self.cache_file.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=str(self.cache_file.parent), prefix=".dirtree_cache.")
+            with os.fdopen(fd, 'w') as f:
+                json.dump(cache, f)
+            os.replace(tmp_path, self.cache_file)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _stamps_match(root, stamps):
+        for relpath, mtime_ns in stamps.items():
+            try:
+                if os.stat(os.path.join(root, relpath)).st_mtime_ns != mtime_ns:
+                    return False
+            except OSError:
+                return False
+        return True
+
+    def _walk(self, root):
+        """Breadth-first walk within the entry and time budgets"""
+        deadline = time.monotonic() + self.time_budget
+        entries = []
+        # mtimes of every directory whose listing we read; any change invalidates the cache
+        stamps = {}
+        timed_out = False
+        queue = [(".", 0)]
+
+        while queue:
+            relpath, depth = queue.pop(0)
+            path = os.path.join(root, relpath)
+            try:
+                stamps[relpath] = os.stat(path).st_mtime_ns
+                with os.scandir(path) as it:
+                    children = sorted(
+                        entry.name for entry in it
+                        if entry.is_dir(follow_symlinks=False)
+                        and entry.name not in SKIP_DIRS
+                        and not _is_virtualenv(entry.path)
+                    )
+            except OSError:
+                continue
+
+            for name in children:
+                child = os.path.join(relpath, name)
+                entries.append((child, depth + 1))
+                if depth + 1 < self.max_depth:
+                    queue.append((child, depth + 1))
+
+            if len(entries) >= self.max_entries:
+                break
+            if time.monotonic() > deadline:
+                timed_out = True
+                break
+
+        return entries, stamps, timed_out
+
+    def _render(self, entries):
+        ranked = sorted(entries, key=lambda e: (_relevance(e[0], e[1]), e[0]))
+        lines = ["."] + [relpath for relpath, _ in ranked[:self.max_entries]]
+        text = ""
+        for line in lines:
+            if len(text) + len(line) + 1 > self.max_chars:
+                break
+            text += line + "\n"
+        return text
+
+    def snapshot(self, root=None):
+        """Return a find-style listing of the most relevant directories under root"""
+        root = os.path.abspath(root or os.getcwd())
+        cache = self._load_cache()
+
+        cached = cache.get(root)
+        if cached and self._stamps_match(root, cached["stamps"]):
+            return cached["text"]
+
+        entries, stamps, timed_out = self._walk(root)
+        text = self._render(entries)
+        if not timed_out:
+            # A walk cut short by the clock depends on timing, so it is not cached
+            cache[root] = {"stamps": stamps, "text": text, "stored": time.time()}
+            self._save_cache(cache)
+        return text
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for an OpenAI-compatible API
+
+Answers /v1/chat/completions deterministically (the same request always gets
+the same reply), with or without streaming, after an injected latency. Use it
+to benchmark or load-test the CLI offline:
+
+    sudothink fake-server --latency 0.3 --token-delay 0.01 &
+    SUDOTHINK_BASE_URL=http://127.0.0.1:8765/fake/v1 sudothink "list files"
+
+Runs against it keep their interactions, context and cached responses in
+~/.sudothink/fake, away from the real ones.
+"""
+
+import sys
+import json
+import time
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+from .backend import FAKE_API_PATH
+
+DEFAULT_PORT = 8765
+
+COMMANDS = ["ls -la", "df -h", "du -sh .", "git status", "ps aux", "uname -a"]
+
+
+def _digest(text):
+    return int(hashlib.sha256(text.encode("utf-8")).hexdigest()[:8], 16)
+
+
+def _user_request(messages):
+    """The user's request from the last message that carries one"""
+    for message in reversed(messages):
+        content = message.get("content") or ""
+        if "USER REQUEST:" in content:
+            return content.split("USER REQUEST:", 1)[1].strip().splitlines()[0]
+    return (messages[-1].get("content") or "") if messages else ""
+
+
+def fake_reply(messages):
+    """Deterministic reply in the shape each mode asks for"""
+    prompt = "\n".join(message.get("content") or "" for message in messages)
+    query = _user_request(messages)
+    command = COMMANDS[_digest(query) % len(COMMANDS)]
+    if "JSON array of steps" in prompt:
+        return json.dumps([
+            {"id": "1", "description": f"Inspect: {query}", "command": command,
+             "explanation": "First look at the current state", "depends_on": []},
+            {"id": "2", "description": "Confirm", "command": "echo done",
+             "explanation": "Report completion", "depends_on": ["1"]},
+        ], indent=2)
+    if "Explain what the user is trying to accomplish" in prompt:
+        return (f"You want to: {query}.\n\nA good starting point is `{command}`. "
+                "Check its output before changing anything.")
+    return command
+
+
+def _tokens(text):
+    """Split a reply into stream chunks of roughly one token each"""
+    words = text.split(" ")
+    return [word + " " for word in words[:-1]] + [words[-1]]
+
+
+class FakeServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency=0.0, token_delay=0.0, rate_limit_every=0):
+        super().__init__(address, FakeHandler)
+        self.latency = latency
+        self.token_delay = token_delay
+        # Every Nth completion gets a 429, for exercising retry logic
+        self.rate_limit_every = rate_limit_every
+        self.requests = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}{FAKE_API_PATH}"
+
+
+class FakeHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self._send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model", "owned_by": "sudothink"}]})
+        else:
+            self._send_json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            request = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": {"message": "invalid JSON", "type": "invalid_request_error"}})
+            return
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        server = self.server
+        with server.lock:
+            server.requests += 1
+            limited = server.rate_limit_every and server.requests % server.rate_limit_every == 0
+        if limited:
+            self._send_json(429, {"error": {"message": "rate limited", "type": "rate_limit_error"}},
+                            headers={"Retry-After": "1"})
+            return
+
+        messages = request.get("messages") or []
+        reply = fake_reply(messages)
+        model = request.get("model", "fake")
+        completion_id = f"chatcmpl-fake{_digest(json.dumps(messages)):x}"
+        prompt_tokens = sum(len(message.get("content") or "") for message in messages) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(_tokens(reply)),
+                 "total_tokens": prompt_tokens + len(_tokens(reply))}
+        time.sleep(server.latency)
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": i, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}
+                            for i in range(max(1, int(request.get("n") or 1)))],
+                "usage": usage,
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model}
+        for i, token in enumerate(_tokens(reply)):
+            if i:
+                time.sleep(server.token_delay)
+            delta = {"role": "assistant", "content": token} if i == 0 else {"content": token}
+            event = dict(chunk, choices=[{"index": 0, "delta": delta, "finish_reason": None}])
+            self._send_chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+        final = dict(chunk, choices=[{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (request.get("stream_options") or {}).get("include_usage"):
+            final["usage"] = usage
+        self._send_chunk(f"data: {json.dumps(final)}\n\n".encode("utf-8"))
+        self._send_chunk(b"data: [DONE]\n\n")
+        self._send_chunk(b"")
+
+
+def main():
+    """Entry point for `sudothink fake-server`"""
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="sudothink fake-server",
+                                     description="Serve deterministic OpenAI-compatible completions locally")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind (default 127.0.0.1)")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port to listen on (default {DEFAULT_PORT})")
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each response starts")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed tokens")
+    parser.add_argument("--rate-limit-every", type=int, default=0, metavar="N",
+                        help="Answer every Nth completion with 429 and Retry-After: 1")
+    args = parser.parse_args()
+
+    server = FakeServer((args.host, args.port), latency=args.latency, token_delay=args.token_delay,
+                        rate_limit_every=args.rate_limit_every)
+    print(f"🧪 Fake OpenAI server on {server.base_url}", file=sys.stderr)
+    print(f"💡 export SUDOTHINK_BASE_URL={server.base_url}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
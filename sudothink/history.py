@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Shell history reader for SudoThink
+
+Reads history files backwards in fixed-size blocks and stops as soon as it has
+enough entries, so huge HISTSIZE files cost the same as small ones.
+"""
+
+import os
+import re
+
+BLOCK_SIZE = 8192
+
+# zsh EXTENDED_HISTORY prefix: ": <start>:<elapsed>;"
+_ZSH_EXTENDED = re.compile(rb"^: \d+:\d+;")
+# bash HISTTIMEFORMAT timestamp lines: "#<epoch>"
+_BASH_TIMESTAMP = re.compile(rb"^#\d+$")
+
+_ZSH_META = 0x83
+
+
+def history_files():
+    """Candidate history files, most specific first"""
+    files = []
+    if os.getenv("HISTFILE"):
+        files.append(os.path.expanduser(os.environ["HISTFILE"]))
+    files += [
+        os.path.expanduser("~/.zsh_history"),
+        os.path.expanduser("~/.bash_history"),
+        os.path.expanduser("~/.history"),
+    ]
+    return files
+
+
+def current_history_file():
+    """The first candidate history file that exists, or None"""
+    for hist_file in history_files():
+        if os.path.exists(hist_file):
+            return hist_file
+    return None
+
+
+def _unmetafy(data):
+    """Undo zsh's metafication of non-ASCII bytes in history files"""
+    if _ZSH_META not in data:
+        return data
+    out = bytearray()
+    it = iter(data)
+    for byte in it:
+        if byte == _ZSH_META:
+            byte = next(it, 0x20) ^ 0x20
+        out.append(byte)
+    return bytes(out)
+
+
+def _group_entries(lines):
+    """Join backslash-continued lines into multi-line entries"""
+    entries = []
+    current = None
+    for line in lines:
+        if current is None:
+            current = [line]
+        else:
+            current.append(line)
+        if not line.endswith(b"\\"):
+            entries.append(current)
+            current = None
+    if current is not None:
+        entries.append(current)
+    return entries
+
+
+def _clean_entry(lines):
+    """Turn the raw lines of one entry into a command string"""
+    first = _ZSH_EXTENDED.sub(b"", lines[0])
+    parts = [first] + lines[1:]
+    parts = [part[:-1] if part.endswith(b"\\") else part for part in parts[:-1]] + [parts[-1]]
+    command = _unmetafy(b"\n".join(parts)).decode("utf-8", errors="ignore")
+    return command.strip()
+
+
+def tail_history(path, limit=10):
+    """Return the last `limit` commands from a history file, oldest first"""
+    if limit <= 0:
+        return []
+    with open(path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        buffer = b""
+
+        while True:
+            read_size = min(BLOCK_SIZE, position)
+            position -= read_size
+            f.seek(position)
+            buffer = f.read(read_size) + buffer
+
+            lines = buffer.split(b"\n")
+            at_start = position == 0
+            if not at_start:
+                # The first line may be cut in half by the block boundary
+                lines = lines[1:]
+            lines = [line for line in lines if not _BASH_TIMESTAMP.match(line)]
+            entries = [entry for entry in _group_entries(lines) if entry != [b""]]
+            if not at_start and entries:
+                # ...and so may the first entry, if it continues an earlier line
+                entries = entries[1:]
+
+            if at_start or len(entries) >= limit:
+                break
+
+    commands = [_clean_entry(entry) for entry in entries]
+    return [command for command in commands if command][-limit:]
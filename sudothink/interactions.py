@@ -0,0 +1,335 @@
+#!/usr/bin/env python3
+"""
+Structured interaction log for SudoThink
+
+Interactions are stored in SQLite with indexes on timestamp, mode and success,
+so searches never scan the whole log. Old rows are rotated out into gzipped
+JSONL archives by age and by database size. Command queries are also kept in
+an FTS5 index, extended incrementally on lookup, for finding similar requests.
+
+An interaction's success is NULL until its outcome is known: the shell marks
+a command once it has run, and only confirmed successes are offered again.
+"""
+
+import os
+import re
+import gzip
+import json
+import time
+import sqlite3
+import contextlib
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_MAX_AGE_DAYS = 90
+DEFAULT_MAX_BYTES = 20 * 1024 * 1024
+
+# Rotation is checked once every this many records
+ROTATE_EVERY = 100
+
+_LEGACY_LINE = re.compile(r"^\[(?P<ts>[^\]]+)\] (?P<field>Query|Response|Success): (?P<value>.*)$")
+
+_CREATE_TABLE = """
+    CREATE TABLE IF NOT EXISTS {name} (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        ts REAL NOT NULL,
+        mode TEXT NOT NULL,
+        query TEXT NOT NULL,
+        response TEXT NOT NULL,
+        success INTEGER,
+        cwd TEXT
+    );
+"""
+
+
+def _outcome(success):
+    """Column value for success: 1, 0, or NULL while not known"""
+    return None if success is None else int(bool(success))
+
+
+class InteractionLog:
+    def __init__(self, db_path=None, max_age_days=DEFAULT_MAX_AGE_DAYS, max_bytes=DEFAULT_MAX_BYTES):
+        self.db_path = Path(db_path or Path.home() / ".sudothink" / "interactions.db")
+        self.archive_dir = self.db_path.parent / "archive"
+        self.max_age_days = max_age_days
+        self.max_bytes = max_bytes
+        self._initialized = False
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=5)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(_CREATE_TABLE.format(name="interactions"))
+            self._migrate(conn)
+            conn.executescript("""
+                CREATE INDEX IF NOT EXISTS interactions_ts ON interactions (ts);
+                CREATE INDEX IF NOT EXISTS interactions_mode_ts ON interactions (mode, ts);
+                CREATE INDEX IF NOT EXISTS interactions_success_ts ON interactions (success, ts);
+            """)
+            self._initialized = True
+        return conn
+
+    def _migrate(self, conn):
+        """Rebuild logs from before outcomes could be unknown, whose success is NOT NULL"""
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {row["name"]: row["notnull"] for row in conn.execute("PRAGMA table_info(interactions)")}
+            if columns.get("success"):
+                conn.execute("ALTER TABLE interactions RENAME TO interactions_old")
+                conn.execute(_CREATE_TABLE.format(name="interactions"))
+                conn.execute("INSERT INTO interactions SELECT * FROM interactions_old")
+                # Keep ids growing past rotated-out rows, which the FTS index relies on
+                conn.execute("UPDATE sqlite_sequence SET seq = (SELECT seq FROM sqlite_sequence "
+                             "WHERE name = 'interactions_old') WHERE name = 'interactions'")
+                conn.execute("DROP TABLE interactions_old")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def record(self, query, response, mode="command", success=None, cwd=None):
+        """Store one interaction and return its id; success None means not known yet"""
+        with self._transaction() as conn:
+            row_id = conn.execute(
+                "INSERT INTO interactions (ts, mode, query, response, success, cwd) VALUES (?, ?, ?, ?, ?, ?)",
+                (time.time(), mode, query, response, _outcome(success), cwd or os.getcwd())
+            ).lastrowid
+        if row_id % ROTATE_EVERY == 0:
+            self.rotate()
+        return row_id
+
+    def mark(self, row_id, success):
+        """Update the outcome of an interaction once it is known"""
+        with self._transaction() as conn:
+            conn.execute("UPDATE interactions SET success = ? WHERE id = ?", (_outcome(success), row_id))
+
+    def mark_latest(self, query, success, mode="command"):
+        """Update the outcome of the most recent interaction for query; returns its id or None"""
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT id FROM interactions WHERE query = ? AND mode = ? ORDER BY id DESC LIMIT 1", (query, mode)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE interactions SET success = ? WHERE id = ?", (_outcome(success), row["id"]))
+        return row["id"]
+
+    def search(self, text=None, mode=None, success=None, since=None, until=None, limit=20):
+        """Most recent interactions matching every given filter"""
+        clauses, params = [], []
+        if mode:
+            clauses.append("mode = ?")
+            params.append(mode)
+        if success is not None:
+            clauses.append("success = ?")
+            params.append(int(bool(success)))
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        if text:
+            clauses.append("(query LIKE ? OR response LIKE ?)")
+            params += [f"%{text}%", f"%{text}%"]
+
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._transaction() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM interactions {where} ORDER BY ts DESC LIMIT ?", params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def _refresh_index(self, conn):
+        """Add command queries logged since the last refresh to the FTS index; False without FTS5"""
+        try:
+            conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS interactions_fts USING fts5(query, tokenize='porter unicode61')")
+        except sqlite3.OperationalError:
+            return False
+        # One statement, so concurrent refreshes can't index a row twice
+        conn.execute("""
+            INSERT INTO interactions_fts (rowid, query)
+            SELECT id, query FROM interactions
+            WHERE mode = 'command'
+              AND id > COALESCE((SELECT rowid FROM interactions_fts ORDER BY rowid DESC LIMIT 1), 0)
+        """)
+        return True
+
+    def similar(self, query, mode="command", success=True, limit=20):
+        """Logged interactions with the given outcome whose queries share words with query, best BM25 match first"""
+        words = list(dict.fromkeys(re.findall(r"\w+", query.lower())))
+        if not words:
+            return []
+        match = " OR ".join(f'"{word}"' for word in words)
+        with self._transaction() as conn:
+            if not self._refresh_index(conn):
+                return []
+            rows = conn.execute(
+                "SELECT interactions.*, bm25(interactions_fts) AS rank FROM interactions_fts "
+                "JOIN interactions ON interactions.id = interactions_fts.rowid "
+                "WHERE interactions_fts MATCH ? AND interactions.mode = ? AND interactions.success = ? "
+                "ORDER BY rank LIMIT ?",
+                (match, mode, int(bool(success)), limit)
+            ).fetchall()
+            if not rows or not success:
+                return [dict(row) for row in rows]
+            # A response that failed after it succeeded is no longer trusted
+            responses = list({row["response"] for row in rows})
+            failed_after = dict(conn.execute(
+                f"SELECT response, MAX(id) FROM interactions WHERE success = 0 AND mode = ? "
+                f"AND response IN ({', '.join('?' * len(responses))}) GROUP BY response",
+                [mode] + responses
+            ).fetchall())
+        return [dict(row) for row in rows if failed_after.get(row["response"], 0) < row["id"]]
+
+    def stats(self):
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT mode, COUNT(*) AS total, SUM(success) AS succeeded FROM interactions GROUP BY mode"
+            ).fetchall()
+        return {row["mode"]: {"total": row["total"], "succeeded": row["succeeded"] or 0} for row in rows}
+
+    def _archive(self, rows):
+        self.archive_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+        name = datetime.now().strftime("interactions-%Y%m%d-%H%M%S-%f.jsonl.gz")
+        with gzip.open(self.archive_dir / name, "wt", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps(dict(row)) + "\n")
+
+    def rotate(self):
+        """Move rows past the age limit, or beyond the size limit, into a compressed archive"""
+        cutoff = time.time() - self.max_age_days * 86400
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT * FROM interactions WHERE ts < ? ORDER BY id", (cutoff,)).fetchall()
+
+            # Pages freed by earlier rotations are reused, so they don't count
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            used_pages = conn.execute("PRAGMA page_count").fetchone()[0] - conn.execute("PRAGMA freelist_count").fetchone()[0]
+            if page_size * used_pages > self.max_bytes:
+                # Over the size limit: rotate out the oldest half
+                total = conn.execute("SELECT COUNT(*) FROM interactions").fetchone()[0]
+                rows = conn.execute("SELECT * FROM interactions ORDER BY id LIMIT ?", (max(total // 2, 1),)).fetchall()
+
+            if not rows:
+                return 0
+            self._archive(rows)
+            conn.executemany("DELETE FROM interactions WHERE id = ?", [(row["id"],) for row in rows])
+            try:
+                conn.executemany("DELETE FROM interactions_fts WHERE rowid = ?", [(row["id"],) for row in rows])
+            except sqlite3.OperationalError:
+                pass  # no index yet
+        return len(rows)
+
+    def import_legacy(self, log_file):
+        """One-time import of the old free-text ~/.ai-terminal-history.log"""
+        if not os.path.exists(log_file):
+            return 0
+        entries = []
+        current = {}
+        with open(log_file, 'r', errors='ignore') as f:
+            for line in f:
+                match = _LEGACY_LINE.match(line.rstrip("\n"))
+                if not match:
+                    continue
+                field, value = match.group("field"), match.group("value")
+                if field == "Query":
+                    current = {"ts": match.group("ts"), "query": value}
+                elif field == "Response" and current:
+                    current["response"] = value
+                elif field == "Success" and "response" in current:
+                    try:
+                        ts = datetime.fromisoformat(current["ts"]).timestamp()
+                    except ValueError:
+                        ts = time.time()
+                    entries.append((ts, "command", current["query"], current["response"], int(value == "True"), None))
+                    current = {}
+
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO interactions (ts, mode, query, response, success, cwd) VALUES (?, ?, ?, ?, ?, ?)",
+                entries
+            )
+        os.replace(log_file, log_file + ".imported")
+        return len(entries)
+
+
+def _parse_age(value):
+    """'7d', '12h' or '30m' to a UNIX timestamp that far in the past"""
+    match = re.fullmatch(r"(\d+)([dhm])", value)
+    if not match:
+        raise ValueError(f"invalid age: {value} (use e.g. 7d, 12h, 30m)")
+    seconds = int(match.group(1)) * {"d": 86400, "h": 3600, "m": 60}[match.group(2)]
+    return time.time() - seconds
+
+
+def main():
+    """Entry point for `sudothink history`"""
+    import argparse
+    from .config import Config
+    from .backend import Backend, data_dir
+
+    parser = argparse.ArgumentParser(prog="sudothink history", description="Search past SudoThink interactions")
+    subparsers = parser.add_subparsers(dest="command")
+    search = subparsers.add_parser("search", help="Search interactions")
+    search.add_argument("text", nargs="?", help="Text to look for in queries and responses")
+    search.add_argument("--mode", choices=["command", "plan", "explain"], help="Only this mode")
+    outcome = search.add_mutually_exclusive_group()
+    outcome.add_argument("--succeeded", action="store_true", help="Only successful interactions")
+    outcome.add_argument("--failed", action="store_true", help="Only failed interactions")
+    search.add_argument("--since", help="Only newer than this age, e.g. 7d, 12h")
+    search.add_argument("--limit", type=int, default=20, help="Maximum results (default 20)")
+    search.add_argument("--json", action="store_true", help="Print results as JSON lines")
+    subparsers.add_parser("stats", help="Show interaction counts per mode")
+    subparsers.add_parser("rotate", help="Archive old interactions now")
+    mark = subparsers.add_parser("mark", help="Record whether the latest answer to a query worked")
+    mark.add_argument("query", help="The query exactly as it was asked")
+    mark.add_argument("--failed", action="store_true", help="The suggested command failed")
+    mark.add_argument("--mode", choices=["command", "plan", "explain"], default="command")
+
+    args = parser.parse_args()
+    config = Config()
+    log = InteractionLog(data_dir(config, Backend.from_config(config)) / "interactions.db")
+
+    if args.command == "stats":
+        for mode, counts in sorted(log.stats().items()):
+            print(f"📊 {mode}: {counts['total']} interactions, {counts['succeeded']} succeeded")
+        return
+    if args.command == "rotate":
+        print(f"✅ Archived {log.rotate()} interactions")
+        return
+    if args.command == "mark":
+        if log.mark_latest(args.query, not args.failed, args.mode) is None:
+            print("ℹ️ No interaction found for that query")
+        return
+    if args.command != "search":
+        parser.print_help()
+        return
+
+    try:
+        since = _parse_age(args.since) if args.since else None
+    except ValueError as e:
+        print(f"❌ {e}")
+        return
+    success = True if args.succeeded else False if args.failed else None
+    results = log.search(args.text, mode=args.mode, success=success, since=since, limit=args.limit)
+
+    for row in results:
+        if args.json:
+            print(json.dumps(row))
+            continue
+        when = datetime.fromtimestamp(row["ts"]).strftime("%Y-%m-%d %H:%M")
+        status = {1: "✅", 0: "❌"}.get(row["success"], "❔")
+        print(f"{status} [{when}] ({row['mode']}) {row['query']}")
+        print(f"   {row['response'].splitlines()[0] if row['response'] else ''}")
+    if not results:
+        print("ℹ️ No matching interactions")
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+"""
+Local manual index for SudoThink
+
+Options documented in installed man pages (or, for programs known to answer
+`--help` harmlessly, in their help output) are indexed in SQLite under
+~/.sudothink, one row per option.
+Pages are indexed lazily, the first time explain mode sees a command, and
+re-indexed when the program on PATH changes. A question that only asks what
+some flags do is answered straight from the index; otherwise the matching
+options are attached to the prompt as excerpts.
+"""
+
+import os
+import re
+import shlex
+import shutil
+import sqlite3
+import contextlib
+import subprocess
+from pathlib import Path
+
+# Seconds `man` or `--help` may take
+RENDER_TIMEOUT = 5
+# Characters of one option's description, and of a program's summary, kept
+MAX_OPTION_CHARS = 600
+MAX_SUMMARY_CHARS = 300
+# Option lines are indented at most this much; deeper lines are descriptions
+MAX_OPTION_INDENT = 16
+DEFAULT_EXCERPTS = 5
+
+# Words that only frame a question about flags ("what does ... do?")
+QUESTION_WORDS = {
+    "what", "whats", "does", "do", "is", "are", "the", "a", "an", "mean", "means", "meaning", "of",
+    "explain", "flag", "flags", "option", "options", "in", "for", "command", "this", "these", "exactly",
+    "please", "tell", "me", "s",
+}
+
+# Programs whose --help only prints usage, so it is safe to run without a man page;
+# the `man_help_programs` setting adds more
+HELP_PROGRAMS = {
+    "cat", "chmod", "chown", "cp", "curl", "cut", "date", "df", "diff", "docker", "du", "find",
+    "git", "grep", "gzip", "head", "jq", "kubectl", "ln", "ls", "mkdir", "mv", "npm", "pip",
+    "pip3", "ps", "rm", "rmdir", "rsync", "sed", "sort", "tail", "tar", "touch", "tr", "uniq",
+    "wc", "wget", "xargs",
+}
+
+_OVERSTRIKE = re.compile(r".\x08")
+_FLAG = re.compile(r"(?<![\w-])(-{1,2}[A-Za-z0-9?#][\w-]*)")
+
+
+def render_page(name, path=None):
+    """(source, text) for a program's manual: its man page, else its --help output"""
+    env = dict(os.environ, MANWIDTH="100", MANPAGER="cat", PAGER="cat")
+    if shutil.which("man"):
+        try:
+            result = subprocess.run(["man", "-P", "cat", name], stdin=subprocess.DEVNULL, capture_output=True,
+                                    text=True, errors="replace", timeout=RENDER_TIMEOUT, env=env)
+            if result.returncode == 0 and result.stdout.strip():
+                return "man", _OVERSTRIKE.sub("", result.stdout)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+    if not path:
+        return None, ""
+    try:
+        result = subprocess.run([path, "--help"], stdin=subprocess.DEVNULL, capture_output=True,
+                                text=True, errors="replace", timeout=RENDER_TIMEOUT, env=env)
+    except (OSError, subprocess.TimeoutExpired):
+        return None, ""
+    return "help", result.stdout or result.stderr
+
+
+def summary(text):
+    """One line saying what the program is: the man page's NAME entry or the first line of help"""
+    lines = [line.strip() for line in text.splitlines()]
+    for i, line in enumerate(lines):
+        if line == "NAME":
+            return next((entry for entry in lines[i + 1:] if entry), "")
+    # Help text: the first paragraph that isn't the usage line
+    paragraph = []
+    for line in lines:
+        if line and not (line.lower().startswith("usage") and not paragraph):
+            paragraph.append(line)
+        elif paragraph:
+            break
+    return " ".join(paragraph)[:MAX_SUMMARY_CHARS]
+
+
+def parse_options(text):
+    """[(flags, description)] for every option paragraph in a man page or help text"""
+    options = []
+    current = None
+    for line in text.expandtabs().splitlines():
+        stripped = line.strip()
+        indent = len(line) - len(line.lstrip())
+        # Lines starting with "-" at the description column are part of a description
+        starts_option = stripped.startswith("-") and indent <= MAX_OPTION_INDENT and \
+            (current is None or current["column"] is None or indent < current["column"])
+        if starts_option:
+            # "-x, --extract, --get   extract files", or the header alone on its line
+            parts = re.split(r"\s{2,}", stripped, maxsplit=1)
+            flags = _FLAG.findall(parts[0])
+            if flags:
+                column = line.index(parts[1], indent + len(parts[0])) if len(parts) > 1 else None
+                current = {"indent": indent, "column": column, "flags": flags, "lines": parts}
+                options.append(current)
+                continue
+        if current is None or not stripped:
+            continue
+        if indent <= current["indent"]:
+            current = None
+            continue
+        if current["column"] is None:
+            current["column"] = indent
+        current["lines"].append(stripped)
+    return [(" ".join(option["flags"]), " ".join(option["lines"])[:MAX_OPTION_CHARS]) for option in options]
+
+
+def split_flags(token):
+    """Flags a command-line token sets: -xzvf -> -x -z -v -f, --file=a -> --file"""
+    token = token.split("=", 1)[0]
+    if token.startswith("--") or len(token) <= 2:
+        return [token]
+    return [token] + [f"-{char}" for char in token[1:]]
+
+
+def _tokens(text):
+    try:
+        return shlex.split(text)
+    except ValueError:
+        return text.split()
+
+
+def find_commands(query):
+    """[(name, flags, rest)] for commands quoted in query or written with flags after them
+
+    rest holds the query's words outside the command, to tell a pure flag question
+    ("what does tar -xzvf do") from one that needs reasoning.
+    """
+    quoted = re.findall(r"`([^`]+)`", query)
+    if quoted:
+        outside = _tokens(re.sub(r"`[^`]+`", " ", query))
+        found = []
+        for snippet in quoted:
+            tokens = _tokens(snippet)
+            if tokens and shutil.which(tokens[0]):
+                found.append((tokens[0], [t for t in tokens[1:] if t.startswith("-")], outside))
+        return found
+
+    tokens = _tokens(query)
+    for i, token in enumerate(tokens):
+        end = i + 1
+        while end < len(tokens) and (tokens[end].startswith("-") or "/" in tokens[end] or "." in tokens[end]):
+            end += 1
+        flags = [t.rstrip("?,.") for t in tokens[i + 1:end] if t.startswith("-")]
+        if flags and shutil.which(token):
+            return [(token, flags, tokens[:i] + tokens[end:])]
+    return []
+
+
+def is_flag_question(rest):
+    """Whether the words around a command only ask what it does"""
+    words = re.findall(r"[a-z]+", " ".join(rest).lower())
+    return all(word in QUESTION_WORDS for word in words)
+
+
+class ManIndex:
+    def __init__(self, db_path=None, help_programs=None):
+        self.db_path = Path(db_path or Path.home() / ".sudothink" / "man_index.db")
+        self.help_programs = HELP_PROGRAMS | set(help_programs or ())
+        self._initialized = False
+        self._fts = False
+
+    def _connect(self):
+        conn = sqlite3.connect(str(self.db_path), timeout=5)
+        conn.row_factory = sqlite3.Row
+        if not self._initialized:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS pages (
+                    name TEXT PRIMARY KEY,
+                    path TEXT NOT NULL,
+                    mtime INTEGER NOT NULL,
+                    source TEXT,
+                    summary TEXT
+                );
+                CREATE TABLE IF NOT EXISTS options (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    flags TEXT NOT NULL,
+                    text TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS options_name ON options (name);
+            """)
+            try:
+                conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS options_fts "
+                             "USING fts5(text, tokenize='porter unicode61')")
+                self._fts = True
+            except sqlite3.OperationalError:
+                self._fts = False
+            self._initialized = True
+        return conn
+
+    @contextlib.contextmanager
+    def _transaction(self):
+        conn = self._connect()
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def ensure(self, name, help_fallback=True):
+        """Index name's manual unless the program is unchanged since; returns False if it has none
+
+        Without a man page, --help is only run for programs in help_programs.
+        """
+        path = shutil.which(name)
+        if not path:
+            return False
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return False
+        with self._transaction() as conn:
+            row = conn.execute("SELECT path, mtime, source FROM pages WHERE name = ?", (name,)).fetchone()
+        if row is not None and row["path"] == path and row["mtime"] == mtime:
+            return row["source"] is not None
+
+        help_path = path if help_fallback and name in self.help_programs else None
+        source, text = render_page(name, help_path)
+        options = parse_options(text) if source else []
+        with self._transaction() as conn:
+            self._remove(conn, name)
+            conn.execute("INSERT INTO pages (name, path, mtime, source, summary) VALUES (?, ?, ?, ?, ?)",
+                         (name, path, mtime, source, summary(text) if source else None))
+            for flags, description in options:
+                row_id = conn.execute("INSERT INTO options (name, flags, text) VALUES (?, ?, ?)",
+                                      (name, flags, description)).lastrowid
+                if self._fts:
+                    conn.execute("INSERT INTO options_fts (rowid, text) VALUES (?, ?)", (row_id, description))
+        return source is not None
+
+    def _remove(self, conn, name):
+        if self._fts:
+            conn.execute("DELETE FROM options_fts WHERE rowid IN (SELECT id FROM options WHERE name = ?)", (name,))
+        conn.execute("DELETE FROM options WHERE name = ?", (name,))
+        conn.execute("DELETE FROM pages WHERE name = ?", (name,))
+
+    def page_summary(self, name):
+        with self._transaction() as conn:
+            row = conn.execute("SELECT summary FROM pages WHERE name = ?", (name,)).fetchone()
+        return row["summary"] if row else None
+
+    def options(self, name):
+        with self._transaction() as conn:
+            rows = conn.execute("SELECT flags, text FROM options WHERE name = ? ORDER BY id", (name,)).fetchall()
+        return [(row["flags"], row["text"]) for row in rows]
+
+    def describe_flags(self, name, flags):
+        """{flag: description} for the flags name documents; combined short flags are split"""
+        by_flag = {}
+        for option_flags, text in self.options(name):
+            for flag in option_flags.split():
+                by_flag.setdefault(flag, text)
+        found = {}
+        for token in flags:
+            whole, *parts = split_flags(token)
+            for flag in ([whole] if whole in by_flag else parts or [whole]):
+                found[flag] = by_flag.get(flag)
+        return found
+
+    def search(self, name, text, limit=DEFAULT_EXCERPTS):
+        """Options of name whose descriptions best match text"""
+        words = list(dict.fromkeys(re.findall(r"\w+", text.lower())))
+        if not words:
+            return []
+        with self._transaction() as conn:
+            if not self._fts:
+                return []
+            rows = conn.execute(
+                "SELECT options.flags, options.text FROM options_fts "
+                "JOIN options ON options.id = options_fts.rowid "
+                "WHERE options_fts MATCH ? AND options.name = ? ORDER BY bm25(options_fts) LIMIT ?",
+                (" OR ".join(f'"{word}"' for word in words), name, limit)
+            ).fetchall()
+        return [(row["flags"], row["text"]) for row in rows]
+
+    def explain(self, query, limit=DEFAULT_EXCERPTS):
+        """(answer or None, excerpts): a direct answer to a pure flag question, else prompt excerpts"""
+        answers, excerpts = [], []
+        direct = True
+        commands = find_commands(query)
+        for name, flags, rest in commands:
+            if not self.ensure(name):
+                direct = False
+                continue
+            described = self.describe_flags(name, flags)
+            seen = set()
+            for flag, text in described.items():
+                if text and text not in seen:
+                    seen.add(text)
+                    excerpts.append(f"{name} {text}")
+            if not flags or None in described.values() or not is_flag_question(rest):
+                direct = False
+            for option_flags, text in self.search(name, query, limit):
+                if text not in seen:
+                    seen.add(text)
+                    excerpts.append(f"{name} {text}")
+            answers.append((name, flags, described))
+        if commands and direct:
+            return "\n\n".join(self._answer(*answer) for answer in answers), excerpts[:limit]
+        return None, excerpts[:limit]
+
+    def _answer(self, name, flags, described):
+        lines = [f"`{name} {' '.join(flags)}`: {self.page_summary(name) or name}"]
+        for text in dict.fromkeys(described.values()):
+            lines.append(f"- {text}")
+        return "\n".join(lines)
+
+    def build(self):
+        """Index every program on PATH that has a man page; returns how many were (re)indexed"""
+        from .pathindex import PathIndex
+
+        count = 0
+        for name in PathIndex().commands():
+            # Running every program with --help is not safe; only read man pages here
+            if self.ensure(name, help_fallback=False):
+                count += 1
+        return count
+
+    def clear(self):
+        with self._transaction() as conn:
+            if self._fts:
+                conn.execute("DELETE FROM options_fts")
+            conn.execute("DELETE FROM options")
+            conn.execute("DELETE FROM pages")
+
+    def stats(self):
+        with self._transaction() as conn:
+            pages = conn.execute("SELECT COUNT(*) FROM pages WHERE source IS NOT NULL").fetchone()[0]
+            options = conn.execute("SELECT COUNT(*) FROM options").fetchone()[0]
+        return {"pages": pages, "options": options}
+
+
+def main():
+    """Entry point for `sudothink man-index`"""
+    import argparse
+    from .config import Config
+
+    parser = argparse.ArgumentParser(prog="sudothink man-index",
+                                     description="Manage the local index of man pages and --help output")
+    parser.add_argument("command", nargs="?", help="Index this program now and list its options")
+    parser.add_argument("--build", action="store_true", help="Index the man page of every program on PATH")
+    parser.add_argument("--clear", action="store_true", help="Remove everything from the index")
+    args = parser.parse_args()
+    config = Config()
+    index = ManIndex(config.config_dir / "man_index.db", config.get_setting("man_help_programs"))
+
+    if args.clear:
+        index.clear()
+        print("✅ Manual index cleared")
+        return
+    if args.build:
+        if not shutil.which("man"):
+            print("❌ man is not installed; only programs known to support --help are indexed, "
+                  "as explain mode meets them")
+            return
+        print(f"✅ Indexed {index.build()} man pages")
+        return
+    if args.command:
+        if not index.ensure(args.command):
+            print(f"ℹ️ No manual found for {args.command} (add it to man_help_programs to index its --help)")
+            return
+        print(f"📖 {index.page_summary(args.command)}")
+        for flags, text in index.options(args.command):
+            print(f"  {text}")
+        return
+
+    stats = index.stats()
+    print(f"📖 Indexed manuals: {stats['pages']}")
+    print(f"🔎 Indexed options: {stats['options']}")
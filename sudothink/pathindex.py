@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Persistent PATH executable index for SudoThink
+
+Each PATH directory's executables are cached on disk together with the
+directory's mtime, so a warm lookup costs one stat per directory and only
+directories that changed are rescanned.
+
+A lookup works on its own copy of the index and swaps it in when done, so a
+lookup abandoned by a collector deadline never mutates state another lookup
+is reading.
+"""
+
+import os
+import json
+import tempfile
+import threading
+from pathlib import Path
+
+INDEX_VERSION = 1
+
+
+class PathIndex:
+    def __init__(self, index_file=None):
+        self.index_file = Path(index_file or Path.home() / ".sudothink" / "path_index.json")
+        self._dirs = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._dirs is not None:
+            return
+        self._dirs = {}
+        try:
+            with open(self.index_file, 'r') as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self._dirs = data.get("dirs", {})
+        except (OSError, ValueError):
+            pass
+
+    def _save(self, dirs):
+        """Write the index atomically so concurrent shells never see a partial file"""
+        try:
+            self.index_file.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=str(self.index_file.parent), prefix=".path_index.")
+            with os.fdopen(fd, 'w') as f:
+                json.dump({"version": INDEX_VERSION, "dirs": dirs}, f)
+            os.replace(tmp_path, self.index_file)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _scan(path_dir):
+        """List the executables in one directory"""
+        commands = []
+        with os.scandir(path_dir) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_file() and os.access(entry.path, os.X_OK):
+                        commands.append(entry.name)
+                except OSError:
+                    continue
+        return sorted(commands)
+
+    def _dir_commands(self, dirs, path_dir):
+        """Executables in path_dir, rescanning (into dirs) only if its mtime changed; (commands, rescanned)"""
+        try:
+            st = os.stat(path_dir)
+        except OSError:
+            return [], False
+        key = [st.st_mtime_ns, st.st_ino]
+        cached = dirs.get(path_dir)
+        if cached and cached.get("key") == key:
+            return cached["commands"], False
+
+        try:
+            commands = self._scan(path_dir)
+        except OSError:
+            return [], False
+        dirs[path_dir] = {"key": key, "commands": commands}
+        return commands, True
+
+    def commands(self, path=None):
+        """All executables on PATH in PATH order, first occurrence wins"""
+        with self._lock:
+            self._load()
+            dirs = dict(self._dirs)
+        path_dirs = (os.getenv("PATH", "") if path is None else path).split(os.pathsep)
+
+        scanned = set()
+        seen = set()
+        commands = []
+        changed = False
+        for path_dir in path_dirs:
+            if not path_dir or path_dir in scanned:
+                continue
+            scanned.add(path_dir)
+            dir_commands, rescanned = self._dir_commands(dirs, path_dir)
+            changed = changed or rescanned
+            for name in dir_commands:
+                if name not in seen:
+                    seen.add(name)
+                    commands.append(name)
+
+        if changed:
+            with self._lock:
+                self._dirs = dirs
+                self._save(dirs)
+        return commands
@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Plan execution for SudoThink
+
+Steps may declare an `id` and `depends_on`; steps whose dependencies are done
+run concurrently on a bounded worker pool, each still approved by the user,
+and a failed step blocks everything that depends on it. Plans without any
+dependency information keep the old one-after-another behaviour.
+
+Steps run in one persistent shell session, so `cd`, `export` and activated
+virtualenvs carry over between them. Steps started while the session is busy
+with another step run separately from the session's last working directory and
+environment.
+
+Plans may arrive wrapped in markdown; StreamingPlanParser picks the steps out,
+one at a time while the response is still streaming.
+
+Step output is streamed as it is produced; only the last few KB are kept for
+failure reports. Each step runs in its own process group so a timeout or
+Ctrl-C stops everything the step started. Sequential steps are handed the
+terminal while they run; concurrent steps get their own session and no
+terminal, so a password prompt fails instead of waiting on our prompts.
+"""
+
+import os
+import json
+import signal
+import threading
+import contextlib
+import subprocess
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from .shell_session import ShellSession, process_group, foreground
+
+DEFAULT_WORKERS = 4
+# Seconds a step may run before it is stopped; 0 means no limit
+DEFAULT_STEP_TIMEOUT = 0
+# Output kept per step for failure reports
+DEFAULT_TAIL_BYTES = 64 * 1024
+# Lines of that output shown when a step fails
+FAILURE_TAIL_LINES = 20
+# Seconds between SIGTERM and SIGKILL when stopping a step
+KILL_GRACE = 3
+
+# Statuses that let dependents go ahead
+_DONE = ("succeeded", "skipped")
+
+
+class PlanStep:
+    def __init__(self, index, data):
+        self.index = index
+        self.id = str(data.get("id") or index)
+        self.description = data.get("description", "Unknown")
+        self.command = data.get("command", "")
+        self.explanation = data.get("explanation")
+        depends_on = data.get("depends_on") or []
+        if not isinstance(depends_on, list):
+            depends_on = [depends_on]
+        self.depends_on = [str(dep) for dep in depends_on]
+        self.timeout = data.get("timeout")
+        self.status = "pending"
+        self.returncode = None
+        self.timed_out = False
+        self.output = None
+        self.process = None
+        self.in_session = False
+
+
+class OutputTail:
+    """Ring buffer holding only the last max_bytes of a step's output"""
+
+    def __init__(self, max_bytes=DEFAULT_TAIL_BYTES):
+        self.max_bytes = max_bytes
+        self.lines = deque()
+        self.size = 0
+        self.dropped = 0
+
+    def append(self, line):
+        self.lines.append(line)
+        self.size += len(line)
+        while self.size > self.max_bytes and len(self.lines) > 1:
+            self.size -= len(self.lines.popleft())
+            self.dropped += 1
+
+    def tail(self, count=None):
+        lines = list(self.lines)
+        return lines[-count:] if count else lines
+
+    def text(self):
+        return "".join(self.lines)
+
+
+class StreamingPlanParser:
+    """Pulls step objects out of a plan while it streams in
+
+    Each step is returned as soon as its closing brace arrives. Anything around
+    the JSON array, such as prose or a ```json fence, is ignored.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self.invalid = 0
+        self.started = False
+        self.finished = False
+        self._current = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, text):
+        """Consume more of the response; return the steps it completed"""
+        completed = []
+        for char in text:
+            if self.finished:
+                break
+            if self._depth == 0:
+                if not self.started:
+                    self.started = char == "["
+                elif char == "{":
+                    self._depth = 1
+                    self._current = [char]
+                elif char == "]":
+                    self.finished = True
+                elif not char.isspace() and char != ",":
+                    self.started = char == "["  # a bracket in prose, not the plan
+                continue
+
+            self._current.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    try:
+                        step = json.loads("".join(self._current))
+                    except ValueError:
+                        step = None
+                    if isinstance(step, dict):
+                        self.steps.append(step)
+                        completed.append(step)
+                    else:
+                        self.invalid += 1
+        return completed
+
+
+def extract_plan(text):
+    """The steps of a plan wrapped in markdown or prose, or None if there is no complete plan"""
+    parser = StreamingPlanParser()
+    parser.feed(text)
+    if not parser.finished or parser.invalid:
+        return None
+    return parser.steps
+
+
+def format_step(step, number=None):
+    """A step as previewed while the plan is still arriving"""
+    lines = [f"{step.get('id') or number}. {step.get('description', 'Unknown')}"]
+    if step.get("command"):
+        lines.append(f"   🤖 {step['command']}")
+    depends_on = step.get("depends_on")
+    if depends_on:
+        if not isinstance(depends_on, list):
+            depends_on = [depends_on]
+        lines.append(f"   ⏳ after {', '.join(str(dep) for dep in depends_on)}")
+    return "\n".join(lines)
+
+
+def parse_plan(plan_json):
+    """Parse a plan into PlanSteps; raises ValueError with a user-facing message"""
+    try:
+        data = json.loads(plan_json) if isinstance(plan_json, str) else plan_json
+    except json.JSONDecodeError:
+        data = extract_plan(plan_json)
+        if data is None:
+            raise ValueError("Invalid JSON in plan")
+    if not isinstance(data, list) or not all(isinstance(step, dict) for step in data):
+        raise ValueError("Invalid plan format")
+
+    steps = [PlanStep(i, step) for i, step in enumerate(data, 1)]
+    by_id = {step.id: step for step in steps}
+    if len(by_id) != len(steps):
+        raise ValueError("Invalid plan: duplicate step ids")
+
+    if not any("depends_on" in step for step in data):
+        # Legacy plan: each step waits for the one before it
+        for previous, step in zip(steps, steps[1:]):
+            step.depends_on = [previous.id]
+
+    for step in steps:
+        unknown = [dep for dep in step.depends_on if dep not in by_id]
+        if unknown:
+            raise ValueError(f"Invalid plan: step {step.id} depends on unknown step {', '.join(unknown)}")
+
+    # Reject cycles so execution always terminates
+    visiting, visited = set(), set()
+
+    def visit(step):
+        if step.id in visited:
+            return
+        if step.id in visiting:
+            raise ValueError(f"Invalid plan: dependency cycle through step {step.id}")
+        visiting.add(step.id)
+        for dep in step.depends_on:
+            visit(by_id[dep])
+        visiting.discard(step.id)
+        visited.add(step.id)
+
+    for step in steps:
+        visit(step)
+    return steps
+
+
+class PlanExecutor:
+    def __init__(self, steps, max_workers=DEFAULT_WORKERS, step_timeout=DEFAULT_STEP_TIMEOUT,
+                 tail_bytes=DEFAULT_TAIL_BYTES, shell_session=True):
+        self.steps = steps
+        self.by_id = {step.id: step for step in steps}
+        self.max_workers = max(1, max_workers)
+        self.step_timeout = step_timeout
+        self.tail_bytes = tail_bytes
+        # A plain chain never runs two steps at once
+        chain = all(step.depends_on == [previous.id] for previous, step in zip(steps, steps[1:]))
+        self.parallel = self.max_workers > 1 and not chain
+        self.output_lock = threading.Lock()
+        # Concurrent steps can't share the terminal's stdin with our prompts
+        self.stdin = subprocess.DEVNULL if self.parallel else None
+        self.session = ShellSession(stdin=self.stdin) if shell_session else None
+        self.session_busy = False
+        # Where steps run outside the session start: (cwd, env)
+        self.snapshot = (None, None)
+
+    def _print(self, text):
+        with self.output_lock:
+            print(text, flush=True)
+
+    def _ready(self, step):
+        deps = [self.by_id[dep] for dep in step.depends_on]
+        if any(dep.status in ("failed", "blocked") for dep in deps):
+            return None
+        return all(dep.status in _DONE for dep in deps)
+
+    def _approve(self, step):
+        self._print(f"\n--- Step {step.id}: {step.description} ---")
+        if step.explanation:
+            self._print(f"💡 {step.explanation}")
+        if not step.command:
+            self._print("❌ No command specified for this step")
+            return False
+        self._print(f"🤖 Command: {step.command}")
+        # Not under the output lock: running steps keep printing while we wait
+        response = input("🚀 Execute this step? [y/N/s] (s=skip): ").lower()
+        if response != 'y':
+            self._print("⏭️ Skipping step")
+            return False
+        return True
+
+    def _stop(self, step):
+        """Terminate the step's whole process group, escalating to SIGKILL"""
+        process = step.process
+        if process is None or process.poll() is not None:
+            return
+        try:
+            os.killpg(process.pid, signal.SIGTERM)
+            try:
+                process.wait(timeout=KILL_GRACE)
+            except subprocess.TimeoutExpired:
+                os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    def _on_timeout(self, step):
+        step.timed_out = True
+        self._stop(step)
+
+    def _run_step(self, step, in_session=False):
+        """Run one step, streaming its output prefixed with the step id"""
+        prefix = f"[{step.id}]"
+        step.output = OutputTail(self.tail_bytes)
+        step.timed_out = False
+        timeout = step.timeout if step.timeout is not None else self.step_timeout
+
+        def emit(line):
+            step.output.append(line)
+            self._print(f"{prefix} {line.rstrip()}")
+
+        try:
+            if in_session:
+                step.process = self.session.start()
+            else:
+                cwd, env = self.snapshot
+                step.process = subprocess.Popen(
+                    step.command, shell=True, text=True, errors="replace", bufsize=1,
+                    stdout=subprocess.PIPE, stderr=subprocess.STDOUT, stdin=self.stdin,
+                    cwd=cwd, env=env,
+                    # Own process group, so stopping the step stops its children too
+                    **process_group(self.stdin is None)
+                )
+        except Exception as e:
+            self._print(f"❌ Error executing command: {e}")
+            return -1
+
+        timer = None
+        if timeout:
+            timer = threading.Timer(timeout, self._on_timeout, (step,))
+            timer.daemon = True
+            timer.start()
+        terminal = foreground(step.process.pid) if self.stdin is None else contextlib.nullcontext()
+        try:
+            with terminal:
+                if in_session:
+                    returncode = self.session.run(step.command, emit)
+                else:
+                    for line in step.process.stdout:
+                        emit(line)
+                    returncode = step.process.wait()
+        finally:
+            if timer:
+                timer.cancel()
+            if not in_session:
+                step.process.stdout.close()
+
+        if step.timed_out:
+            self._print(f"⏱️ Step {step.id} stopped after {timeout}s")
+        if in_session:
+            if not self.session.alive:
+                self._print(f"ℹ️ Shell session ended; later steps start a new one in {self.session.cwd}")
+            elif self.parallel:
+                self.snapshot = (self.session.cwd, self.session.environment())
+        return returncode
+
+    def _report_failure(self, step):
+        self._print(f"❌ Step {step.id} failed with exit code {step.returncode}")
+        # Sequential output is still on screen; interleaved output needs the recap
+        if self.parallel and step.output and step.output.lines:
+            self._print(f"--- Last output of step {step.id} ---")
+            for line in step.output.tail(FAILURE_TAIL_LINES):
+                self._print(f"  {line.rstrip()}")
+
+    def run(self):
+        """Execute the plan; return True if no approved step failed"""
+        running = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            try:
+                self._schedule(pool, running)
+            except KeyboardInterrupt:
+                # Stop the steps before the pool waits for their threads
+                for step in running.values():
+                    self._stop(step)
+                self._print("\n⏹️ Plan cancelled")
+                return False
+            finally:
+                if self.session:
+                    self.session.close()
+        return not any(step.status in ("failed", "blocked") for step in self.steps)
+
+    def _schedule(self, pool, running):
+        """Approve and start ready steps until nothing is left to run"""
+        while True:
+            progressed = False
+            for step in self.steps:
+                if step.status not in ("pending", "retry") or len(running) >= self.max_workers:
+                    continue
+                ready = self._ready(step)
+                if ready is None:
+                    step.status = "blocked"
+                    self._print(f"\n⛔ Step {step.id} not run: a step it depends on failed")
+                elif not ready:
+                    continue
+                elif step.status == "retry" or self._approve(step):
+                    step.status = "running"
+                    step.in_session = self.session is not None and not self.session_busy
+                    self.session_busy = self.session_busy or step.in_session
+                    running[pool.submit(self._run_step, step, step.in_session)] = step
+                else:
+                    step.status = "skipped"
+                progressed = True
+
+            if not running:
+                if progressed:
+                    continue
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                step = running.pop(future)
+                step.returncode = future.result()
+                if step.in_session:
+                    self.session_busy = False
+                if step.returncode == 0:
+                    step.status = "succeeded"
+                    self._print(f"✅ Step {step.id} done")
+                    continue
+                self._report_failure(step)
+                retry = input("🔄 Retry this step? [y/N]: ").lower()
+                step.status = "retry" if retry == 'y' else "failed"
+
+
+def plan_options(config):
+    """Executor settings from config.json"""
+    return {
+        "max_workers": config.get_setting("plan_workers", DEFAULT_WORKERS),
+        "step_timeout": config.get_setting("plan_step_timeout", DEFAULT_STEP_TIMEOUT),
+        "tail_bytes": config.get_setting("plan_output_tail_kb", DEFAULT_TAIL_BYTES // 1024) * 1024,
+        "shell_session": config.get_setting("plan_shell_session", True),
+    }
+
+
+def execute_plan(plan_json, **options):
+    """Parse and execute a plan, reporting problems the way the CLI does"""
+    try:
+        steps = parse_plan(plan_json)
+    except ValueError as e:
+        print(f"❌ {e}")
+        return False
+
+    print(f"\n📋 Executing {len(steps)} steps:")
+    try:
+        return PlanExecutor(steps, **options).run()
+    except Exception as e:
+        print(f"❌ Error executing plan: {e}")
+        return False
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Speculative context prefetch for SudoThink
+
+ai.zsh runs `sudothink prefetch` in the background from its chpwd and precmd
+hooks. It writes a per-shell snapshot of the slow context sources (PATH,
+shell history), so by the time the user types `ai ...` the assistant can use
+the snapshot instead of collecting from scratch. A snapshot is only used for
+the directory it was taken in and while it is fresh; recent commands are
+re-read if the history file changed since.
+
+The directory listing is not snapshotted, since files come and go between
+prompts; prefetching only warms the DirectorySnapshot cache, which checks
+directory mtimes on every use.
+"""
+
+import os
+import json
+import time
+import tempfile
+from .history import current_history_file, tail_history
+
+# Context sources worth taking ahead of time
+PREFETCHED = ("available_commands", "recent_commands")
+
+# Seconds a snapshot stays usable
+DEFAULT_MAX_AGE = 120
+
+
+def shell_pid():
+    """PID of the interactive shell this process belongs to, as set by ai.zsh"""
+    return os.getenv("SUDOTHINK_SHELL_PID")
+
+
+def snapshot_file(config_dir, pid):
+    return os.path.join(str(config_dir), "prefetch", f"{pid}.json")
+
+
+def _history_stamp():
+    hist_file = current_history_file()
+    if not hist_file:
+        return None
+    try:
+        st = os.stat(hist_file)
+    except OSError:
+        return None
+    return [hist_file, st.st_mtime_ns, st.st_size]
+
+
+def collect_snapshot(config_dir, cwd=None, command_limit=50, history_limit=10):
+    """Collect the prefetched sources without an assistant (no API key or SDK needed)"""
+    from .pathindex import PathIndex
+    from .dirtree import DirectorySnapshot
+
+    cwd = cwd or os.getcwd()
+    values = {}
+    try:
+        values["available_commands"] = PathIndex(os.path.join(str(config_dir), "path_index.json")).commands()[:command_limit]
+    except Exception:
+        pass
+    try:
+        # Only warms the cache; the listing itself is read fresh when a query needs it
+        DirectorySnapshot(os.path.join(str(config_dir), "dirtree_cache.json")).snapshot(cwd)
+    except Exception:
+        pass
+    stamp = _history_stamp()
+    if stamp:
+        try:
+            values["recent_commands"] = tail_history(stamp[0], history_limit)
+        except OSError:
+            pass
+    return {"cwd": cwd, "created": time.time(), "history": stamp, "values": values}
+
+
+def write_snapshot(path, snapshot):
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".prefetch.")
+    with os.fdopen(fd, 'w') as f:
+        json.dump(snapshot, f)
+    os.replace(tmp_path, path)
+
+
+def load_snapshot(path, cwd=None, max_age=DEFAULT_MAX_AGE):
+    """Prefetched values usable for cwd right now, or {}"""
+    try:
+        with open(path, 'r') as f:
+            snapshot = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if snapshot.get("cwd") != (cwd or os.getcwd()) or time.time() - snapshot.get("created", 0) > max_age:
+        return {}
+    values = {name: value for name, value in (snapshot.get("values") or {}).items() if name in PREFETCHED}
+    if snapshot.get("history") != _history_stamp():
+        values.pop("recent_commands", None)
+    return values
+
+
+def prune(config_dir):
+    """Remove snapshots left behind by shells that are gone"""
+    directory = os.path.join(str(config_dir), "prefetch")
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return
+    for name in names:
+        pid = name[:-len(".json")] if name.endswith(".json") else None
+        if not pid or not pid.isdigit():
+            continue
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            try:
+                os.unlink(os.path.join(directory, name))
+            except OSError:
+                pass
+        except OSError:
+            pass  # alive but not ours to signal
+
+
+def main():
+    """Entry point for `sudothink prefetch` (run by the ai.zsh hooks)"""
+    from .config import Config
+
+    pid = shell_pid()
+    if not pid:
+        return
+    config = Config()
+    write_snapshot(snapshot_file(config.config_dir, pid), collect_snapshot(config.config_dir))
+    prune(config.config_dir)
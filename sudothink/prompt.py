@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Token-budgeted prompt builder for SudoThink
+
+Static instructions go first so the prefix is identical across calls (and can
+hit provider-side prompt caching); volatile context follows, with each section
+trimmed to its own token budget and lower-priority sections trimmed first when
+the whole prompt is over budget.
+"""
+
+DEFAULT_MAX_TOKENS = 1500
+
+# Default per-section budgets in tokens
+DEFAULT_BUDGETS = {
+    "system_context": 100,
+    "recent_commands": 150,
+    "available_commands": 150,
+    "directory_structure": 300,
+    "previous_context": 400,
+    "similar_commands": 150,
+    "man_pages": 300,
+}
+
+_encoder = None
+
+
+def count_tokens(text, tokenizer=None):
+    """Token count of text: exact with tiktoken when configured, else ~4 chars per token"""
+    global _encoder
+    if tokenizer == "tiktoken":
+        try:
+            if _encoder is None:
+                import tiktoken
+                _encoder = tiktoken.get_encoding("cl100k_base")
+            return len(_encoder.encode(text))
+        except Exception:
+            pass
+    return (len(text) + 3) // 4
+
+
+class PromptSection:
+    def __init__(self, name, title, items, priority, joiner="\n", keep="head", empty="None"):
+        self.name = name
+        self.title = title
+        self.items = list(items)
+        # Lower numbers are more important and are trimmed last
+        self.priority = priority
+        self.joiner = joiner
+        # Which end of the items survives trimming
+        self.keep = keep
+        self.empty = empty
+
+    def render(self):
+        body = self.joiner.join(self.items) if self.items else self.empty
+        return f"{self.title}:\n{body}\n" if self.title else f"{body}\n"
+
+    def trim(self, budget, tokenizer=None):
+        """Drop items from the far end until the section fits in budget"""
+        ordered = self.items if self.keep == "head" else list(reversed(self.items))
+        kept = []
+        used = count_tokens(self.title or "", tokenizer) + 1
+        for item in ordered:
+            cost = count_tokens(item + self.joiner, tokenizer)
+            if used + cost > budget:
+                break
+            kept.append(item)
+            used += cost
+        self.items = kept if self.keep == "head" else list(reversed(kept))
+
+
+class PromptBuilder:
+    def __init__(self, budgets=None, max_tokens=DEFAULT_MAX_TOKENS, tokenizer=None):
+        self.budgets = dict(DEFAULT_BUDGETS, **(budgets or {}))
+        self.max_tokens = max_tokens
+        self.tokenizer = tokenizer
+        self.static = []
+        self.sections = []
+
+    def add_static(self, text):
+        """Text that is identical on every call with the same mode"""
+        self.static.append(text.strip())
+
+    def add_section(self, section):
+        self.sections.append(section)
+
+    def _tokens(self, section):
+        return count_tokens(section.render(), self.tokenizer)
+
+    def _fit(self):
+        for section in self.sections:
+            budget = self.budgets.get(section.name)
+            if budget is not None and self._tokens(section) > budget:
+                section.trim(budget, self.tokenizer)
+
+        # Still over the total: squeeze the least important sections first
+        overflow = sum(self._tokens(s) for s in self.sections) - self.max_tokens
+        for section in sorted(self.sections, key=lambda s: -s.priority):
+            if overflow <= 0 or section.priority == 0:
+                break
+            current = self._tokens(section)
+            section.trim(max(current - overflow, 0), self.tokenizer)
+            overflow -= current - self._tokens(section)
+
+    def build(self):
+        """Return (static_text, context_text, report of tokens per section)"""
+        self._fit()
+        static_text = "\n\n".join(self.static)
+        context_text = "\n".join(section.render() for section in self.sections)
+
+        report = {"static": count_tokens(static_text, self.tokenizer)}
+        for section in self.sections:
+            report[section.name] = self._tokens(section)
+        report["total"] = sum(report.values())
+        return static_text, context_text, report
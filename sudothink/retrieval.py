@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval of previously successful commands
+
+Before a command request goes to the network, the interaction log's FTS index
+is searched for similar past requests whose commands are known to have worked.
+A request with the same tokens in the same order, arguments included, is
+answered from history with no API call; requests that only share words are
+added to the prompt as examples.
+"""
+
+import re
+import sqlite3
+
+DEFAULT_EXAMPLE_CONFIDENCE = 0.3
+DEFAULT_EXAMPLES = 3
+
+# Words that say little about which command is wanted
+_STOPWORDS = {
+    "a", "an", "the", "all", "in", "into", "of", "on", "to", "for", "from", "with", "and", "my", "me",
+    "this", "that", "these", "those", "please", "i", "want", "can", "you", "how", "do", "is", "it",
+}
+# A plain word, possibly ending a sentence
+_WORD = re.compile(r"([A-Za-z]+)[.,!?]*")
+
+
+def terms(text):
+    """Content words of text, lowercased, with a plural 's' dropped"""
+    words = set()
+    for word in re.findall(r"\w+", text.lower()):
+        if word in _STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.add(word)
+    return words
+
+
+def tokens(text):
+    """text's whitespace-separated tokens in order; plain words lowercased without punctuation, the rest as typed"""
+    result = []
+    for token in text.split():
+        word = _WORD.fullmatch(token)
+        result.append(word.group(1).lower() if word else token)
+    return result
+
+
+def similarity(a, b):
+    """Jaccard overlap of two requests' content words, from 0 to 1, ignoring their order"""
+    a, b = terms(a), terms(b)
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class Match:
+    def __init__(self, row, confidence, exact=False):
+        self.id = row["id"]
+        self.query = row["query"]
+        self.command = row["response"]
+        self.cwd = row.get("cwd")
+        self.confidence = confidence
+        # Same request: same tokens in the same order
+        self.exact = exact
+
+    def rank(self):
+        return self.exact, self.confidence, self.id
+
+
+class Retriever:
+    def __init__(self, log, example_confidence=DEFAULT_EXAMPLE_CONFIDENCE, examples=DEFAULT_EXAMPLES):
+        self.log = log
+        self.example_confidence = example_confidence
+        self.examples = examples
+
+    def lookup(self, query, mode="command"):
+        """Past successful answers to similar requests, exact and most similar first, one per command"""
+        try:
+            rows = self.log.similar(query, mode=mode)
+        except sqlite3.Error:
+            return []
+        wanted = tokens(query)
+        matches = {}
+        for row in rows:
+            match = Match(row, similarity(query, row["query"]), tokens(row["query"]) == wanted)
+            best = matches.get(match.command)
+            if best is None or match.rank() > best.rank():
+                matches[match.command] = match
+        return sorted(matches.values(), key=Match.rank, reverse=True)
+
+    def retrieve(self, query, mode="command", accept=None):
+        """(match to answer with directly or None, matches to use as examples)
+
+        accept(match) can veto a direct answer, e.g. if the command no longer runs here.
+        """
+        matches = self.lookup(query, mode)
+        direct = None
+        if matches and matches[0].exact:
+            if accept is None or accept(matches[0]):
+                direct = matches[0]
+        examples = [match for match in matches
+                    if match is not direct and match.confidence >= self.example_confidence]
+        return direct, examples[:self.examples]
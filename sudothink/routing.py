@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Model routing for SudoThink
+
+Queries are scored by complexity and sent to the model the routing table
+names for their tier and mode, so simple command requests go to a fast model.
+When an answer fails validation or its command fails to run, the request is
+escalated to the next model in the escalation chain.
+"""
+
+from .backend import DEFAULT_MODEL
+
+FAST_MODEL = "gpt-4o-mini"
+
+COMPLEXITY_KEYWORDS = [
+    "multiple", "several", "steps", "first", "then", "after", "before",
+    "complex", "complicated", "setup", "install", "configure", "build",
+    "deploy", "migrate", "backup", "restore", "analyze", "process"
+]
+
+TIERS = ["simple", "moderate", "complex"]
+
+# Mode -> tier -> model; anything not listed uses the backend's model
+DEFAULT_ROUTES = {
+    "command": {"simple": FAST_MODEL},
+}
+
+
+def complexity_score(query):
+    query_lower = query.lower()
+    return sum(1 for keyword in COMPLEXITY_KEYWORDS if keyword in query_lower)
+
+
+def complexity_tier(query):
+    score = complexity_score(query)
+    if score == 0:
+        return "simple"
+    return "moderate" if score <= 2 else "complex"
+
+
+class ModelRouter:
+    def __init__(self, default_model=DEFAULT_MODEL, routes=None, escalation=None):
+        self.default_model = default_model
+        self.routes = DEFAULT_ROUTES if routes is None else routes
+        # Models in order of capability; escalation moves one step along
+        self.escalation = escalation or [FAST_MODEL, default_model]
+
+    @classmethod
+    def from_config(cls, config, backend):
+        routes = config.get_setting("model_routes", None)
+        escalation = config.get_setting("model_escalation", None)
+        if routes is None and backend.model_configured:
+            # A chosen model (e.g. a local server's) is used for everything unless routes say otherwise
+            routes = {}
+            escalation = escalation or [backend.model]
+        return cls(backend.model, routes, escalation)
+
+    def route(self, query, mode="command"):
+        """Model for this query's tier and mode"""
+        table = self.routes.get(mode) or {}
+        if isinstance(table, str):
+            return table
+        return table.get(complexity_tier(query)) or table.get("default") or self.default_model
+
+    def escalate(self, model):
+        """The next more capable model after model, or None at the top"""
+        if model not in self.escalation:
+            return self.escalation[-1]
+        index = self.escalation.index(model)
+        return self.escalation[index + 1] if index + 1 < len(self.escalation) else None
+
+    @property
+    def strongest(self):
+        return self.escalation[-1]
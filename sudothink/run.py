@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Run mode for SudoThink
+
+`sudothink run <query>` suggests a command, runs it once confirmed and, if it
+fails, asks for a correction in the same conversation. Context is collected
+once and the conversation so far is sent unchanged, so each correction adds
+only the exit status and the last lines of the command's error output.
+"""
+
+import sys
+import sqlite3
+import subprocess
+from .plan import OutputTail
+from .cache import cache_key, context_fingerprint
+from .validate import command_shell
+
+# Corrections offered before giving up
+MAX_CORRECTIONS = 3
+# Error output kept while a command runs, and lines of it sent back
+ERROR_TAIL_BYTES = 4096
+ERROR_TAIL_LINES = 20
+
+
+def run_command(command, tail_bytes=ERROR_TAIL_BYTES, echo=None):
+    """Run command in the shell it was checked with, passing its stderr through to echo
+    (sys.stderr by default); return (exit status, stderr tail)"""
+    echo = echo or sys.stderr
+    tail = OutputTail(tail_bytes)
+    process = subprocess.Popen([command_shell(), "-c", command], stderr=subprocess.PIPE,
+                               text=True, errors="replace")
+    for line in process.stderr:
+        echo.write(line)
+        echo.flush()
+        tail.append(line)
+    return process.wait(), tail
+
+
+def failure_message(status, tail, lines=ERROR_TAIL_LINES):
+    """What a correction request says: how the last command failed, nothing else"""
+    output = "".join(tail.tail(lines)).strip()
+    if output:
+        message = f"That command failed with exit status {status}. Last lines of its error output:\n{output}\n"
+    else:
+        message = f"That command failed with exit status {status} and printed no error output.\n"
+    return message + "Return only a corrected command that works on this system."
+
+
+class RunSession:
+    def __init__(self, assistant=None, use_cache=True):
+        from .chat import ChatSession
+
+        self.chat = ChatSession(assistant)
+        self.assistant = self.chat.assistant
+        self.use_cache = use_cache
+        self.corrected = False
+        # Problems found in the first suggestion while it was generated
+        self.problems = []
+
+    def fingerprint(self):
+        return context_fingerprint(backend=self.assistant.backend)
+
+    def suggest(self, query):
+        """First suggestion, through the usual cache, history and validation"""
+        command = self.assistant.generate_response(query, mode="command", use_cache=self.use_cache)
+        self.problems = self.assistant.last_metrics.get("problems") or []
+        self.chat.remember(query, command, collection=self.assistant.last_collection)
+        return command
+
+    def correct(self, status, tail):
+        """A corrected command from the most capable model, continuing the conversation"""
+        request = {"role": "user", "content": failure_message(status, tail)}
+        self.corrected = True
+        return self.chat.send(request, "command", self.assistant.router.strongest)
+
+    def failed(self, query):
+        """Stop offering a command that just failed, from the cache or from history"""
+        try:
+            self.assistant.response_cache.invalidate(cache_key(query, "command", self.fingerprint()))
+            self.assistant.interactions.mark_latest(query, False)
+        except sqlite3.Error:
+            pass
+
+    def succeeded(self, query, command):
+        """Confirm the suggestion worked, or remember a correction that did as the answer to the original query"""
+        if not self.corrected:
+            try:
+                self.assistant.interactions.mark_latest(query, True)
+            except sqlite3.Error:
+                pass
+            return
+        self.assistant.log_interaction(query, command, True)
+        if self.use_cache:
+            try:
+                self.assistant.response_cache.put(cache_key(query, "command", self.fingerprint()),
+                                                  query, "command", command)
+            except sqlite3.Error:
+                pass
+
+
+def main():
+    """Entry point for `sudothink run`"""
+    import argparse
+    from openai import AuthenticationError
+
+    parser = argparse.ArgumentParser(
+        prog="sudothink run",
+        description="Suggest a command, run it and, if it fails, correct it in the same conversation"
+    )
+    parser.add_argument("query", nargs="+", help="What the command should do")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--max-corrections", type=int, default=MAX_CORRECTIONS,
+                        help=f"Corrections to offer before giving up (default {MAX_CORRECTIONS})")
+    args = parser.parse_args()
+    query = " ".join(args.query)
+
+    try:
+        session = RunSession(use_cache=not args.no_cache)
+        command = session.suggest(query)
+        label = "Suggested command"
+        for attempt in range(args.max_corrections + 1):
+            print(f"\n🤖 {label}:\n{command}")
+            # The suggestion was checked while it was generated; only corrections need checking here
+            problems = session.assistant.validate_command(command) if session.corrected else session.problems
+            for problem in problems:
+                print(f"⚠️ {problem}", file=sys.stderr)
+            if input("\n🚀 Run this command? [y/N]: ").lower() != "y":
+                return
+            status, tail = run_command(command)
+            if status == 0:
+                session.succeeded(query, command)
+                return
+            session.failed(query)
+            print(f"\n❌ Command failed with exit status {status}")
+            if attempt == args.max_corrections or \
+                    input("\n🔄 Retry with corrected command? [y/N]: ").lower() != "y":
+                sys.exit(status)
+            command = session.correct(status, tail)
+            label = "Corrected command"
+    except AuthenticationError:
+        print("❌ Invalid OpenAI API key. Please check OPENAI_API_KEY.")
+        sys.exit(1)
+    except (EOFError, KeyboardInterrupt):
+        print("\n⏹️ Cancelled")
+        sys.exit(130)
+    except Exception as e:
+        print(f"❌ LLM error: {e}")
+        sys.exit(1)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Persistent shell session for SudoThink plans
+
+Plan steps run one after another inside a single long-lived shell, so `cd`,
+`export` and `source venv/bin/activate` carry over from step to step and no
+new shell is started per step. Commands are fed to the shell on a separate
+file descriptor, leaving stdin free for the commands themselves; after each
+command the shell prints a marker line with the exit code and working
+directory.
+
+A step that runs with the terminal gets its own process group in our session
+and is made the terminal's foreground group while it runs, so sudo, ssh and
+/dev/tty prompts work and a timeout can still stop the whole group.
+"""
+
+import os
+import sys
+import shlex
+import signal
+import secrets
+import tempfile
+import contextlib
+import subprocess
+
+
+def shell_command(script_path, shell=None):
+    """argv running script_path with the user's shell, skipping startup files"""
+    shell = shell or os.environ.get("SHELL") or "/bin/sh"
+    name = os.path.basename(shell)
+    if name == "bash":
+        return [shell, "--noprofile", "--norc", script_path]
+    if name == "zsh":
+        return [shell, "-f", script_path]
+    # Unknown shells may not speak POSIX sh (fish, nu, ...)
+    return ["/bin/sh", script_path]
+
+
+def process_group(terminal):
+    """Popen arguments that start the child in its own process group
+
+    With terminal the child stays in our session so it can be handed the
+    terminal; without, it gets a new session and no controlling terminal.
+    """
+    if not terminal:
+        return {"start_new_session": True}
+    if sys.version_info >= (3, 11):
+        return {"process_group": 0}
+    return {"preexec_fn": os.setpgrp}
+
+
+def _claim_terminal(pgid):
+    """Make pgid the terminal's foreground group; return (fd, previous group) or None"""
+    try:
+        fd = os.open("/dev/tty", os.O_RDWR | os.O_NOCTTY)
+    except OSError:
+        return None
+    try:
+        previous = os.tcgetpgrp(fd)
+        if previous == os.getpgrp():
+            os.tcsetpgrp(fd, pgid)
+            # A child that read the terminal before it was handed over is stopped
+            os.killpg(pgid, signal.SIGCONT)
+            return fd, previous
+    except OSError:
+        pass
+    os.close(fd)
+    return None
+
+
+def _release_terminal(fd, previous):
+    # We are a background group now, and tcsetpgrp would stop us with SIGTTOU
+    mask = signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGTTOU})
+    try:
+        os.tcsetpgrp(fd, previous)
+    except OSError:
+        pass
+    finally:
+        signal.pthread_sigmask(signal.SIG_SETMASK, mask)
+        os.close(fd)
+
+
+@contextlib.contextmanager
+def foreground(pgid):
+    """Give the terminal to process group pgid while the block runs
+
+    Does nothing without a controlling terminal or when we aren't its
+    foreground group (e.g. started in the background).
+    """
+    claim = _claim_terminal(pgid)
+    try:
+        yield
+    finally:
+        if claim:
+            _release_terminal(*claim)
+
+
+class ShellSession:
+    def __init__(self, shell=None, cwd=None, stdin=None):
+        self.shell = shell
+        self.cwd = cwd or os.getcwd()
+        self.stdin = stdin
+        self.process = None
+        self._script_fd = None
+        self.marker = f"__SUDOTHINK_{secrets.token_hex(8)}__"
+
+    @property
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        """Start the shell if it isn't running; return its process"""
+        if self.alive:
+            return self.process
+        self.close()
+        read_fd, self._script_fd = os.pipe()
+        try:
+            self.process = subprocess.Popen(
+                shell_command(f"/dev/fd/{read_fd}", self.shell),
+                cwd=self.cwd if os.path.isdir(self.cwd) else None,
+                stdin=self.stdin, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                text=True, errors="replace", bufsize=1,
+                pass_fds=(read_fd,),
+                # Own process group, so a stuck step can be stopped with its children
+                **process_group(self.stdin is None)
+            )
+        finally:
+            os.close(read_fd)
+        return self.process
+
+    def run(self, command, on_output):
+        """Run command in the session, passing each output line to on_output; return its exit code"""
+        self.start()
+        script = f"eval {shlex.quote(command)}\nprintf '%s:%s:%s\\n' {self.marker} \"$?\" \"$PWD\"\n"
+        try:
+            os.write(self._script_fd, script.encode())
+        except BrokenPipeError:
+            return self.process.wait()
+
+        prefix = self.marker + ":"
+        for line in self.process.stdout:
+            index = line.find(prefix)
+            if index < 0:
+                on_output(line)
+                continue
+            if index:
+                on_output(line[:index])  # output that didn't end in a newline
+            status, _, cwd = line[index + len(prefix):].rstrip("\n").partition(":")
+            self.cwd = cwd or self.cwd
+            return int(status)
+
+        # The shell itself exited (`exit`, a fatal error or a kill)
+        return self.process.wait()
+
+    def environment(self):
+        """The session's exported environment, for commands run outside it"""
+        fd, path = tempfile.mkstemp(prefix="sudothink-env.")
+        os.close(fd)
+        try:
+            if self.run(f"command env -0 > {shlex.quote(path)}", lambda line: None) != 0:
+                return None
+            with open(path, 'rb') as f:
+                data = f.read()
+        finally:
+            os.unlink(path)
+        env = {}
+        for item in data.split(b"\0"):
+            name, sep, value = item.decode(errors="replace").partition("=")
+            if sep:
+                env[name] = value
+        return env
+
+    def close(self):
+        """End the shell, letting it exit on its own if it can"""
+        if self._script_fd is not None:
+            try:
+                os.close(self._script_fd)  # EOF on the script ends the shell
+            except OSError:
+                pass
+            self._script_fd = None
+        if self.process is not None:
+            try:
+                self.process.wait(timeout=1)
+            except subprocess.TimeoutExpired:
+                try:
+                    os.killpg(self.process.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+                self.process.wait()
+            self.process.stdout.close()
+            self.process = None
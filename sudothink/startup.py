@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Cold-start profiling for SudoThink
+
+Runs each entry path in a fresh interpreter with `-X importtime` and reports
+the import cost per module, so startup regressions show up in review.
+"""
+
+import os
+import sys
+import subprocess
+
+# Import statements timed for each CLI path
+ENTRY_PATHS = [
+    ("cli", "import sudothink.cli"),
+    ("setup", "import sudothink.setup"),
+    ("daemon client", "import sudothink.daemon"),
+    ("assistant", "import sudothink.assistant"),
+]
+
+# Modules that must never be imported just to start the CLI
+HEAVY_MODULES = ["openai", "httpx", "pydantic"]
+
+DEFAULT_BUDGET_MS = 50
+
+
+def measure_imports(statement):
+    """Return [(module, self_us, cumulative_us)] for a statement in a fresh interpreter"""
+    package_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [package_root, env.get("PYTHONPATH")]))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True, text=True, env=env
+    )
+
+    modules = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            modules.append((name.strip(), int(self_us), int(cumulative_us)))
+        except ValueError:
+            continue
+    return modules
+
+
+def report(top=15, budget_ms=None):
+    """Print per-module import times for each entry path; return False if over budget"""
+    if budget_ms is None:
+        budget_ms = float(os.getenv("SUDOTHINK_STARTUP_BUDGET_MS", DEFAULT_BUDGET_MS))
+
+    # Interpreter startup (site, encodings, ...) is not ours to budget
+    baseline = {name for name, _, _ in measure_imports("pass")}
+
+    within_budget = True
+    for label, statement in ENTRY_PATHS:
+        modules = [m for m in measure_imports(statement) if m[0] not in baseline]
+        if not modules:
+            print(f"❌ {label}: unable to measure `{statement}`")
+            within_budget = False
+            continue
+
+        total_ms = sum(self_us for _, self_us, _ in modules) / 1000
+        print(f"\n⏱️ {label} ({statement}): {total_ms:.1f} ms across {len(modules)} modules")
+        for name, self_us, cumulative_us in sorted(modules, key=lambda m: -m[2])[:top]:
+            print(f"  {cumulative_us / 1000:8.1f} ms  (self {self_us / 1000:6.1f} ms)  {name}")
+
+        if label == "assistant":
+            continue
+        loaded = {name.split(".")[0] for name, _, _ in modules}
+        heavy = [name for name in HEAVY_MODULES if name in loaded]
+        if heavy:
+            print(f"⚠️ {label} loads heavy modules eagerly: {', '.join(heavy)}")
+            within_budget = False
+        if total_ms > budget_ms:
+            print(f"⚠️ {label} exceeds the {budget_ms:.0f} ms startup budget")
+            within_budget = False
+
+    return within_budget
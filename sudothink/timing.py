@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Per-phase timings for SudoThink
+
+Each query records how long every phase took (startup, imports, context
+collectors, prompt building, network and generation). `--timings` prints
+them; setting `metrics_file` (or SUDOTHINK_METRICS_FILE) appends one JSON
+line per query, with token usage, for fleet-wide percentiles via
+`sudothink metrics`.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+
+
+class Timings:
+    """Named spans in seconds; spans recorded more than once accumulate"""
+
+    def __init__(self):
+        self.spans = {}
+        self.lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def span(self, name):
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - begin)
+
+    def add(self, name, seconds):
+        with self.lock:
+            self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def update(self, spans, prefix=""):
+        for name, seconds in spans.items():
+            self.add(prefix + name, seconds)
+
+    def as_ms(self):
+        with self.lock:
+            return {name: round(seconds * 1000, 2) for name, seconds in self.spans.items()}
+
+
+def process_uptime():
+    """Seconds since this process (or the shell function that launched it) started"""
+    # ai.zsh stamps the moment the user pressed enter
+    started = os.getenv("SUDOTHINK_T0")
+    if started:
+        try:
+            return max(time.time() - float(started), 0.0)
+        except ValueError:
+            pass
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces; fields resume after its ')'
+            fields = f.read().rsplit(")", 1)[1].split()
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(uptime - int(fields[19]) / os.sysconf("SC_CLK_TCK"), 0.0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def format_timings(spans_ms, file=None):
+    """Print spans as an indented table; dotted names are shown under their parent"""
+    file = file or sys.stderr
+    print("⏱️ Timings:", file=file)
+    for name, ms in spans_ms.items():
+        depth = name.count(".")
+        label = "  " * depth + name.rsplit(".", 1)[-1]
+        print(f"  {label:<28} {ms:>9.1f} ms", file=file)
+
+
+def metrics_path(config=None):
+    path = os.getenv("SUDOTHINK_METRICS_FILE")
+    if not path and config is not None:
+        path = config.get_setting("metrics_file", None)
+    return os.path.expanduser(path) if path else None
+
+
+def append_metrics(path, record):
+    """Append one record as a JSON line; a single write keeps concurrent appends whole"""
+    line = json.dumps(dict(record, ts=record.get("ts", time.time())), separators=(",", ":")) + "\n"
+    try:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'a') as f:
+            f.write(line)
+    except OSError:
+        pass
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    index = min(int(round(fraction * (len(values) - 1))), len(values) - 1)
+    return values[index]
+
+
+def summarize(lines):
+    """Per-span count, p50 and p95 (ms) over metrics JSON lines"""
+    samples = {}
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        for name, ms in (record.get("spans") or {}).items():
+            samples.setdefault(name, []).append(ms)
+        for name, count in (record.get("usage") or {}).items():
+            if count is not None:
+                samples.setdefault(f"usage.{name}", []).append(count)
+    return {
+        name: {"count": len(values), "p50": _percentile(values, 0.5), "p95": _percentile(values, 0.95)}
+        for name, values in samples.items()
+    }
+
+
+def main():
+    """Entry point for `sudothink metrics`"""
+    import argparse
+    from .config import Config
+
+    parser = argparse.ArgumentParser(prog="sudothink metrics", description="Summarize recorded query timings")
+    parser.add_argument("files", nargs="*", help="Metrics JSONL files (default: the configured metrics_file)")
+    args = parser.parse_args()
+
+    files = args.files or [metrics_path(Config())]
+    if not files[0]:
+        print("ℹ️ No metrics file configured. Set metrics_file in config.json or SUDOTHINK_METRICS_FILE.")
+        return
+    lines = []
+    for path in files:
+        try:
+            with open(path, 'r') as f:
+                lines.extend(f)
+        except OSError as e:
+            print(f"❌ Cannot read {path}: {e}")
+            return
+
+    summary = summarize(lines)
+    if not summary:
+        print("ℹ️ No timings recorded yet")
+        return
+    print(f"{'span':<40} {'count':>7} {'p50':>10} {'p95':>10}")
+    for name, stats in summary.items():
+        print(f"{name:<40} {stats['count']:>7} {stats['p50']:>10.1f} {stats['p95']:>10.1f}")
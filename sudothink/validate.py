@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+"""
+Local checks for generated shell commands
+
+Before a command is shown it is parsed with the user's shell (`-n`, which
+reads but never executes) and every command name it starts is looked up in
+PATH and the shell's builtins. Both checks are local and take milliseconds.
+"""
+
+import os
+import shlex
+import shutil
+import subprocess
+
+# Seconds the shell gets to parse a command
+SYNTAX_TIMEOUT = 2
+
+# Names that are not on PATH but are always available in bash/zsh
+SHELL_BUILTINS = {
+    ".", ":", "[", "[[", "alias", "bg", "bind", "break", "builtin", "case", "cd", "command", "compgen",
+    "complete", "continue", "declare", "dirs", "disown", "do", "done", "echo", "elif", "else", "enable",
+    "esac", "eval", "exec", "exit", "export", "false", "fc", "fg", "fi", "for", "function", "getopts",
+    "hash", "help", "history", "if", "in", "jobs", "kill", "let", "local", "logout", "noglob", "popd",
+    "print", "printf", "pushd", "pwd", "read", "readonly", "return", "select", "set", "setopt", "shift",
+    "source", "test", "then", "time", "times", "trap", "true", "type", "typeset", "ulimit", "umask",
+    "unalias", "unset", "unsetopt", "until", "wait", "whence", "where", "which", "while", "{", "}", "!",
+    "((", "))",
+}
+
+# Words that run the next word as the command, with their options that take a separate value
+PREFIX_COMMANDS = {
+    "sudo": {"-u", "-g", "-C", "-D", "-h", "-p", "-r", "-t", "-U", "--user", "--group", "--chdir",
+             "--close-from", "--host", "--prompt", "--role", "--type", "--other-user"},
+    "env": {"-u", "-C", "-S", "--unset", "--chdir", "--split-string"},
+    "time": {"-f", "-o", "--format", "--output"},
+    "nohup": set(),
+    "exec": {"-a"},
+    "command": set(),
+    "builtin": set(),
+    "nice": {"-n", "--adjustment"},
+    "noglob": set(),
+    "xargs": {"-I", "-n", "-P", "-L", "-s", "-d", "-E", "-a", "--max-args", "--max-procs",
+              "--max-lines", "--max-chars", "--delimiter", "--arg-file", "--replace"},
+}
+
+# Stands for the arguments xargs and find -exec fill in
+_PLACEHOLDER = "{}"
+
+_SEPARATORS = {"|", "||", "&", "&&", ";", ";;", "(", ")", "|&", "\n"}
+
+
+def command_shell(shell=None):
+    """The shell commands are parsed and run with: the user's bash/zsh when installed, else bash or sh"""
+    shell = shell or os.environ.get("SHELL") or ""
+    if os.path.basename(shell) in ("bash", "zsh") and shutil.which(shell):
+        return shell
+    return shutil.which("bash") or "/bin/sh"
+
+
+def syntax_error(command, shell=None):
+    """The shell's parse error for command, or None if it parses"""
+    try:
+        result = subprocess.run(
+            [command_shell(shell), "-n", "-c", command],
+            stdin=subprocess.DEVNULL, capture_output=True, text=True, timeout=SYNTAX_TIMEOUT
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None  # can't tell; don't block the command on it
+    if result.returncode == 0:
+        return None
+    return (result.stderr.strip().splitlines() or ["syntax error"])[0]
+
+
+def command_names(command):
+    """Names of the commands a command line starts, one per pipeline segment"""
+    try:
+        lexer = shlex.shlex(command, posix=True, punctuation_chars=True)
+        lexer.whitespace_split = True
+        tokens = list(lexer)
+    except ValueError:
+        return []
+
+    names = []
+    expect_command = True
+    # Options of the last prefix command that take a value, and whether the next token is one
+    value_options = set()
+    skip_value = False
+    for token in tokens:
+        if token in _SEPARATORS:
+            expect_command = True
+            value_options, skip_value = set(), False
+            continue
+        if not expect_command:
+            continue
+        if skip_value:
+            skip_value = False
+            continue  # e.g. postgres in `sudo -u postgres psql`
+        if "=" in token and not token.startswith("=") and token.split("=", 1)[0].isidentifier():
+            continue  # VAR=value before the command
+        if token in PREFIX_COMMANDS:
+            value_options = PREFIX_COMMANDS[token]
+            continue
+        if token.startswith("-"):
+            skip_value = token in value_options
+            continue
+        if token == _PLACEHOLDER:
+            continue
+        names.append(token)
+        expect_command = False
+    return names
+
+
+def missing_commands(command, available):
+    """Command names that are neither builtins, paths nor in the available set"""
+    available = set(available)
+    missing = []
+    for name in command_names(command):
+        if name in SHELL_BUILTINS or name in available:
+            continue
+        if "/" in name or "$" in name or "`" in name:
+            continue  # a path or something only the shell can resolve
+        missing.append(name)
+    return missing
+
+
+def check_command(command, available=None, shell=None):
+    """Problems found in a generated command; empty if it looks runnable"""
+    if not command.strip():
+        return ["empty command"]
+    error = syntax_error(command, shell)
+    if error:
+        return [f"syntax error: {error}"]
+    if available is None:
+        return []
+    return [f"command not found: {name}" for name in missing_commands(command, available)]
@@ -6,11 +6,43 @@ Run this before pushing to production
 
 import os
 import sys
+import json
 import tempfile
 import shutil
 import subprocess
 from pathlib import Path
 
+class FakeBackend:
+    """A fake OpenAI server on a free port, with HOME pointed at a temp dir, for one test"""
+    
+    ENVIRONMENT = ("HOME", "SUDOTHINK_BASE_URL", "SUDOTHINK_NO_DAEMON", "OPENAI_API_KEY")
+    
+    def __init__(self, temp_dir, **options):
+        self.temp_dir = temp_dir
+        self.options = options
+    
+    def __enter__(self):
+        import threading
+        from sudothink.fakeserver import FakeServer
+        
+        self.server = FakeServer(("127.0.0.1", 0), **self.options)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.saved = {name: os.environ.get(name) for name in self.ENVIRONMENT}
+        os.environ.pop("OPENAI_API_KEY", None)
+        os.environ["HOME"] = self.temp_dir
+        os.environ["SUDOTHINK_BASE_URL"] = self.server.base_url
+        os.environ["SUDOTHINK_NO_DAEMON"] = "1"
+        return self
+    
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+        for name, value in self.saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
 def test_config_module():
     """Test the config module functionality"""
     print("🧪 Testing config module...")
@@ -169,6 +201,1072 @@ def test_backward_compatibility():
         print(f"❌ Backward compatibility test failed: {e}")
         return False
 
+def test_lazy_imports():
+    """Test that the CLI entry point does not load the OpenAI SDK"""
+    print("\n🧪 Testing lazy imports...")
+    
+    try:
+        result = subprocess.run([sys.executable, "-c",
+                                 "import sys, sudothink.cli, sudothink.setup; print('openai' in sys.modules)"],
+                              capture_output=True, text=True)
+        assert result.returncode == 0, "CLI modules should import cleanly"
+        assert result.stdout.strip() == "False", "CLI import should not load openai"
+        print("✅ CLI starts without importing openai")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Lazy import test failed: {e}")
+        return False
+
+def test_path_index():
+    """Test the persistent PATH executable index"""
+    print("\n🧪 Testing PATH index...")
+    
+    try:
+        from sudothink.pathindex import PathIndex
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            bin_dir = Path(temp_dir) / "bin"
+            bin_dir.mkdir()
+            tool = bin_dir / "mytool"
+            tool.write_text("#!/bin/sh\n")
+            tool.chmod(0o755)
+            (bin_dir / "notes.txt").write_text("not executable")
+            index_file = Path(temp_dir) / "index.json"
+            
+            assert PathIndex(index_file).commands(str(bin_dir)) == ["mytool"], "Should list executables only"
+            assert index_file.exists(), "Index should be persisted"
+            print("✅ PATH directory indexed")
+            
+            other = bin_dir / "othertool"
+            other.write_text("#!/bin/sh\n")
+            other.chmod(0o755)
+            os.utime(bin_dir, ns=(0, bin_dir.stat().st_mtime_ns + 1_000_000_000))
+            commands = PathIndex(index_file).commands(str(bin_dir))
+            assert commands == ["mytool", "othertool"], "Changed directory should be rescanned"
+            print("✅ Changed PATH directory rescanned")
+        
+        return True
+    except Exception as e:
+        print(f"❌ PATH index test failed: {e}")
+        return False
+
+def test_history_reader():
+    """Test the tail-seeking shell history reader"""
+    print("\n🧪 Testing history reader...")
+    
+    try:
+        from sudothink.history import tail_history
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            hist_file = Path(temp_dir) / ".zsh_history"
+            lines = [f": 17000000{i:02d}:0;echo {i}" for i in range(50)]
+            lines.append(": 1700000099:2;for f in *; do\\\n  echo $f\\\ndone")
+            hist_file.write_text("\n".join(lines) + "\n")
+            
+            commands = tail_history(str(hist_file), 3)
+            assert commands == ["echo 48", "echo 49", "for f in *; do\n  echo $f\ndone"], f"Unexpected entries: {commands}"
+            print("✅ Extended and multi-line history entries parsed")
+        
+        return True
+    except Exception as e:
+        print(f"❌ History reader test failed: {e}")
+        return False
+
+def test_directory_snapshot():
+    """Test the budgeted, mtime-cached directory listing"""
+    print("\n🧪 Testing directory snapshot...")
+    
+    try:
+        from sudothink.dirtree import DirectorySnapshot
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            root = Path(temp_dir) / "project"
+            for name in ["src/app", "docs", "node_modules/pkg"]:
+                (root / name).mkdir(parents=True)
+            cache_file = Path(temp_dir) / "dirtree_cache.json"
+            snapshot = DirectorySnapshot(cache_file)
+            
+            text = snapshot.snapshot(str(root))
+            assert "./src" in text and "./src/app" in text and "node_modules" not in text, text
+            
+            def no_walk(root):
+                raise AssertionError("an unchanged directory should come from the cache")
+            
+            cached = DirectorySnapshot(cache_file)
+            cached._walk = no_walk
+            assert cached.snapshot(str(root)) == text, "Unchanged directories are served from the cache"
+            print("✅ Unchanged directories reuse the cached listing")
+            
+            (root / "tests").mkdir()
+            assert "./tests" in DirectorySnapshot(cache_file).snapshot(str(root)), "New directories invalidate it"
+            print("✅ Changes invalidate the cache")
+            
+            other = Path(temp_dir) / "other"
+            (other / "a" / "b").mkdir(parents=True)
+            hurried = DirectorySnapshot(Path(temp_dir) / "hurried.json", time_budget=0)
+            text = hurried.snapshot(str(other))
+            assert "./a" in text and "./a/b" not in text, "The walk stops once the time budget is spent"
+            assert not (Path(temp_dir) / "hurried.json").exists(), "Walks cut short are not cached"
+            print("✅ Time budget respected")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Directory snapshot test failed: {e}")
+        return False
+
+def test_context_collection():
+    """Test concurrent collectors with deadlines"""
+    print("\n🧪 Testing context collection...")
+    
+    try:
+        import time
+        import threading
+        from sudothink.collect import collect
+        
+        finished = threading.Event()
+        
+        def slow():
+            time.sleep(0.3)
+            finished.set()
+            return ["late"]
+        
+        result = collect({"fast": lambda: ["ls"], "slow": slow, "broken": lambda: 1 / 0},
+                         deadlines={"fast": 0.5, "slow": 0.05, "broken": 0.5},
+                         fallbacks={"slow": [], "broken": []})
+        assert result["fast"] == ["ls"] and result["slow"] == [] and result["broken"] == []
+        assert result.timed_out == ["slow"] and result.failed == ["broken"]
+        print("✅ Missed deadlines and errors fall back")
+        
+        assert finished.wait(2), "The slow collector should eventually finish"
+        time.sleep(0.05)
+        assert result["slow"] == [] and "slow" not in result.durations, "Late results are ignored"
+        print("✅ Abandoned collectors can't change the result")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Context collection test failed: {e}")
+        return False
+
+def test_response_cache():
+    """Test the local response cache"""
+    print("\n🧪 Testing response cache...")
+    
+    try:
+        from sudothink.cache import ResponseCache, cache_key
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = ResponseCache(Path(temp_dir) / "cache.db", max_entries=2)
+            fingerprint = {"os": "Linux", "shell": "zsh", "cwd_class": "home"}
+            key = cache_key("Disk usage by folder?", "command", fingerprint)
+            
+            assert cache.get(key) is None, "Empty cache should miss"
+            cache.put(key, "Disk usage by folder?", "command", "du -sh */")
+            assert cache.get(cache_key("disk  usage by folder", "command", fingerprint)) == "du -sh */", \
+                "Normalized query should hit"
+            assert cache.get(cache_key("disk usage by folder", "explain", fingerprint)) is None, "Mode is part of the key"
+            print("✅ Cache hits on normalized queries")
+            
+            for query in ["a", "b"]:
+                cache.put(cache_key(query, "command", fingerprint), query, "command", query)
+            stats = cache.stats()
+            assert stats["entries"] == 2, "Cache should evict beyond max_entries"
+            assert stats["hits"] == 1 and stats["misses"] == 2, f"Unexpected counters: {stats}"
+            print("✅ Cache evicts and counts hits and misses")
+            
+            from sudothink.backend import Backend, data_dir
+            from sudothink.cache import context_fingerprint
+            from types import SimpleNamespace
+            
+            real = Backend(api_key="sk-test", model="gpt-4")
+            fake = Backend(base_url="http://127.0.0.1:8765/fake/v1", model="gpt-4")
+            keys = {cache_key("list files", "command", context_fingerprint(backend=backend))
+                    for backend in (real, fake, Backend(api_key="sk-test", model="gpt-4o-mini"))}
+            assert len(keys) == 3, "Backend URL and model are part of the key"
+            config = SimpleNamespace(config_dir=Path(temp_dir))
+            assert not real.fake and fake.fake
+            assert data_dir(config, real) == config.config_dir and data_dir(config, fake) != config.config_dir, \
+                "Fake server runs keep their own interactions, context and cache"
+            print("✅ Answers kept per backend")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Response cache test failed: {e}")
+        return False
+
+def test_streaming_response():
+    """Test streamed generation against the fake server"""
+    print("\n🧪 Testing streaming responses...")
+    
+    try:
+        import openai  # noqa: F401
+    except ImportError:
+        print("⚠️ Streaming test skipped (openai module not installed)")
+        return True
+    
+    temp_dir = tempfile.mkdtemp()
+    try:
+        import time
+        from sudothink.assistant import AITerminalAssistant
+        
+        with FakeBackend(temp_dir, token_delay=0.01):
+            assistant = AITerminalAssistant()
+            tokens = []
+            arrivals = []
+            
+            def on_token(text):
+                tokens.append(text)
+                arrivals.append(time.monotonic())
+            
+            started = time.monotonic()
+            result = assistant.generate_response("how can I free up disk space", mode="explain",
+                                                 use_cache=False, stream=True, on_token=on_token)
+            finished = time.monotonic()
+        
+        assert len(tokens) > 1, "The reply arrives in several pieces"
+        assert "".join(tokens).strip() == result, "Tokens arrive in order and add up to the reply"
+        print("✅ Tokens streamed in order")
+        
+        metrics = assistant.last_metrics
+        assert 0 < metrics["ttft"] < metrics["total"], "Time to first token is recorded before the total"
+        assert metrics["ttft"] <= arrivals[0] - started + 0.01 and arrivals[-1] <= finished
+        assert metrics["usage"] and metrics["usage"]["total_tokens"] > 0, "Usage is read from the stream"
+        print("✅ Time to first token recorded")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Streaming test failed: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir)
+
+def test_chat_session():
+    """Test chat conversation memory and context reuse"""
+    print("\n🧪 Testing chat session...")
+    
+    try:
+        import openai  # noqa: F401
+    except ImportError:
+        print("⚠️ Chat test skipped (openai module not installed)")
+        return True
+    
+    temp_dir = tempfile.mkdtemp()
+    previous_dir = os.getcwd()
+    try:
+        from sudothink.chat import ChatSession
+        
+        with FakeBackend(temp_dir):
+            session = ChatSession()
+            collected = []
+            build_context_prompt = session.assistant.build_context_prompt
+            session.assistant.build_context_prompt = lambda collection=None: (
+                collected.append(os.getcwd()) or build_context_prompt(collection))
+            
+            first = session.ask("list files by size")
+            second = session.ask("now only the largest one")
+            assert first and second and len(session.turns) == 2
+            messages = session.messages({"role": "user", "content": "next"})
+            assert messages[3]["content"].startswith("USER REQUEST: list files by size") and \
+                messages[4]["content"] == first, "Earlier turns are sent with later ones"
+            assert len(collected) == 1, "Context is collected once while nothing changes"
+            print("✅ Conversation remembered, context reused")
+            
+            os.chdir(temp_dir)
+            session.ask("list files by size")
+            assert len(collected) == 2 and collected[-1] == os.getcwd(), "Changing directory refreshes context"
+            print("✅ Context refreshed after a directory change")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Chat session test failed: {e}")
+        return False
+    finally:
+        os.chdir(previous_dir)
+        shutil.rmtree(temp_dir)
+
+def test_context_store():
+    """Test the bounded, append-only context store"""
+    print("\n🧪 Testing context store...")
+    
+    try:
+        from sudothink.context_store import ContextStore
+        
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = ContextStore(Path(temp_dir) / "context.jsonl", max_entries=10, max_bytes=2048)
+            for i in range(100):
+                store.append({"query": f"query {i}", "cwd": "/project" if i % 10 == 0 else "/other"})
+            
+            assert store.path.stat().st_size <= 2 * 2048 + 200, "Store should be compacted"
+            recent = store.load_recent(3)
+            assert [e["query"] for e in recent] == ["query 97", "query 98", "query 99"], "Should load newest entries"
+            print("✅ Context store stays bounded")
+            
+            local = store.load_recent(2, cwd="/project")
+            assert all(e["cwd"] == "/project" for e in local), "Should prefer entries from the same directory"
+            print("✅ Context store prefers the current directory")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Context store test failed: {e}")
+        return False
+
+def test_prompt_budget():
+    """Test that an oversized section is trimmed without touching the others"""
+    print("\n🧪 Testing prompt budgets...")
+    
+    try:
+        from sudothink.prompt import PromptBuilder, PromptSection
+        
+        def build(history, max_tokens=1500):
+            builder = PromptBuilder(budgets={"recent_commands": 50}, max_tokens=max_tokens)
+            builder.add_static("You are a shell assistant.")
+            builder.add_section(PromptSection("system_context", "SYSTEM CONTEXT", ["- OS: Linux"], priority=0))
+            builder.add_section(PromptSection("recent_commands", "RECENT COMMANDS", history, priority=1, keep="tail"))
+            builder.add_section(PromptSection("directory_structure", "DIRECTORY STRUCTURE",
+                                              ["src/", "README.md"], priority=2))
+            builder.add_section(PromptSection("available_commands", "AVAILABLE COMMANDS",
+                                              ["git", "ls", "grep"], priority=3, joiner=", "))
+            return builder, builder.build()
+        
+        small_builder, (static, small_context, _) = build(["ls"])
+        history = [f"echo command number {i}" for i in range(500)]
+        builder, (big_static, context, report) = build(history)
+        assert big_static == static, "Static prefix does not depend on the context"
+        assert report["recent_commands"] <= 50, "Overflowing section is cut to its budget"
+        recent = builder.sections[1].items
+        assert recent and recent == history[-len(recent):], "Most recent commands are kept"
+        for kept, original in zip(builder.sections, small_builder.sections):
+            if kept.name != "recent_commands":
+                assert kept.render() == original.render(), f"{kept.name} kept intact"
+        print("✅ Overflowing section trimmed, other sections kept")
+        
+        builder, (_, _, report) = build(["ls"] * 5, max_tokens=30)
+        names = {section.name: section for section in builder.sections}
+        assert names["system_context"].items == ["- OS: Linux"], "Priority 0 is never trimmed"
+        assert not names["available_commands"].items, "Least important section is cut first"
+        assert names["recent_commands"].items, "More important sections survive"
+        print("✅ Total budget trims lowest priority first")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Prompt budget test failed: {e}")
+        return False
+
+def test_interaction_rotation():
+    """Test archiving of old interactions and history search filters"""
+    print("\n🧪 Testing interaction rotation...")
+    
+    temp_dir = tempfile.mkdtemp()
+    saved_home, saved_argv = os.environ.get("HOME"), sys.argv
+    try:
+        import gzip
+        import io
+        import time
+        import contextlib
+        from sudothink.interactions import InteractionLog, ROTATE_EVERY, main as history_main
+        
+        os.environ["HOME"] = temp_dir
+        log = InteractionLog(Path(temp_dir) / ".sudothink" / "interactions.db")
+        log.db_path.parent.mkdir()
+        for i in range(1, ROTATE_EVERY):
+            log.record(f"query {i}", f"echo {i}")
+        with log._transaction() as conn:
+            conn.execute("UPDATE interactions SET ts = ? WHERE id <= 10", (time.time() - 100 * 86400,))
+            conn.execute("UPDATE interactions SET ts = ? WHERE id > 90", (time.time() - 2 * 86400,))
+            conn.execute("UPDATE interactions SET success = 0 WHERE id > 95")
+        log.record("query 100", "echo 100")
+        
+        archives = sorted(log.archive_dir.glob("*.jsonl.gz"))
+        assert len(archives) == 1, "Reaching the row limit rotates old rows out"
+        with gzip.open(archives[0], "rt") as f:
+            archived = [json.loads(line) for line in f]
+        assert [row["id"] for row in archived] == list(range(1, 11)), "Only rows past the age limit are archived"
+        remaining = log.search(limit=1000)
+        assert len(remaining) == 90 and min(row["id"] for row in remaining) == 11
+        print("✅ Old rows archived, recent rows kept")
+        
+        log.max_bytes = 1
+        assert log.rotate() == 45, "Over the size limit the oldest half is archived"
+        assert len(list(log.archive_dir.glob("*.jsonl.gz"))) == 2
+        assert min(row["id"] for row in log.search(limit=1000)) == 56
+        print("✅ Size limit rotates out the oldest half")
+        
+        def search(*args):
+            sys.argv = ["sudothink history", "search", "--json", "--limit", "1000", *args]
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                history_main()
+            return [json.loads(line)["id"] for line in output.getvalue().splitlines()]
+        
+        assert sorted(search("--failed")) == list(range(96, 100)), "--failed returns only failures"
+        assert sorted(search("--since", "1d")) == list(range(56, 91)) + [100], "--since drops older rows"
+        assert sorted(search("--failed", "--since", "3d")) == list(range(96, 100)), "Filters combine"
+        print("✅ History search filters work")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Interaction rotation test failed: {e}")
+        return False
+    finally:
+        sys.argv = saved_argv
+        if saved_home is None:
+            os.environ.pop("HOME", None)
+        else:
+            os.environ["HOME"] = saved_home
+        shutil.rmtree(temp_dir)
+
+def test_plan_process_groups():
+    """Test that plan steps get their own process group and can be stopped"""
+    print("\n🧪 Testing plan process groups...")
+    
+    import builtins
+    saved_input = builtins.input
+    try:
+        import io
+        import time
+        import shlex
+        import contextlib
+        from sudothink.plan import PlanExecutor, parse_plan
+        
+        probe = shlex.quote(sys.executable) + " -c 'import os; print(\"group\", os.getpgrp(), os.getsid(0))'"
+        builtins.input = lambda prompt="": "y"
+        
+        def run(steps, **options):
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                executor = PlanExecutor(parse_plan(json.dumps(steps)), **options)
+                ok = executor.run()
+            groups = [tuple(map(int, line.split()[2:])) for line in output.getvalue().splitlines() if " group " in line]
+            return ok, groups
+        
+        for shell_session in (True, False):
+            ok, groups = run([{"description": "Probe", "command": probe}], shell_session=shell_session)
+            assert ok and len(groups) == 1
+            group, session = groups[0]
+            assert group != os.getpgrp(), "Steps run in their own process group"
+            assert session == os.getsid(0), "Sequential steps stay in our session, with the terminal"
+        print("✅ Sequential steps keep the terminal's session")
+        
+        ok, groups = run([{"id": "a", "description": "A", "command": probe, "depends_on": []},
+                          {"id": "b", "description": "B", "command": probe, "depends_on": []}])
+        assert ok and len(groups) == 2
+        assert all(session != os.getsid(0) for _, session in groups), "Concurrent steps are detached"
+        print("✅ Concurrent steps detached from the terminal")
+        
+        answers = iter(["y", "n"])  # run it, don't retry it
+        builtins.input = lambda prompt="": next(answers)
+        started = time.monotonic()
+        ok, _ = run([{"description": "Hang", "command": "sleep 30 & wait", "timeout": 1}], shell_session=False)
+        assert not ok and time.monotonic() - started < 10, "Timeout stops the step and its children"
+        print("✅ Timeout stops the whole step")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Plan process group test failed: {e}")
+        return False
+    finally:
+        builtins.input = saved_input
+
+def test_plan_parsing():
+    """Test plan dependency parsing"""
+    print("\n🧪 Testing plan parsing...")
+    
+    try:
+        from sudothink.plan import parse_plan
+        
+        steps = parse_plan('[{"command": "a"}, {"command": "b"}]')
+        assert steps[1].depends_on == ["1"], "Plans without dependencies should run in order"
+        print("✅ Legacy plans run sequentially")
+        
+        steps = parse_plan('[{"id": "x", "command": "a"}, {"id": "y", "command": "b"}, '
+                           '{"id": "z", "command": "c", "depends_on": ["x", "y"]}]')
+        assert steps[0].depends_on == [] and steps[1].depends_on == [], "Independent steps have no dependencies"
+        assert steps[2].depends_on == ["x", "y"], "Declared dependencies should be kept"
+        print("✅ Declared dependencies parsed")
+        
+        for bad in ['[{"id": "a", "depends_on": ["b"]}, {"id": "b", "depends_on": ["a"]}]',
+                    '[{"id": "a", "depends_on": ["missing"]}]', 'not json']:
+            try:
+                parse_plan(bad)
+                assert False, f"Should reject {bad}"
+            except ValueError:
+                pass
+        print("✅ Invalid plans rejected")
+        
+        from sudothink.plan import OutputTail
+        tail = OutputTail(max_bytes=100)
+        for i in range(1000):
+            tail.append(f"line {i}\n")
+        assert tail.size <= 100, "Step output tail should stay bounded"
+        assert tail.tail(1) == ["line 999\n"], "Step output tail should keep the newest lines"
+        print("✅ Step output tail bounded")
+        
+        from sudothink.shell_session import ShellSession
+        session = ShellSession(shell="/bin/sh", cwd="/")
+        output = []
+        try:
+            assert session.run("cd /tmp && export SUDOTHINK_TEST=1", output.append) == 0
+            assert session.run("echo $SUDOTHINK_TEST; false", output.append) == 1, "Exit codes should be reported"
+            assert output == ["1\n"], "Exports should carry over between steps"
+            assert session.cwd == "/tmp", "Directory changes should carry over between steps"
+        finally:
+            session.close()
+        print("✅ Shell session keeps state between steps")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Plan parsing test failed: {e}")
+        return False
+
+def test_batch_input():
+    """Test batch query parsing"""
+    print("\n🧪 Testing batch input...")
+    
+    try:
+        import types
+        from sudothink.batch import parse_queries, retry_after
+        
+        items = parse_queries(["list files", "", '{"id": 7, "query": "disk usage", "mode": "explain"}',
+                               '{"query": "x", "mode": "bogus"}'])
+        assert len(items) == 3, "Blank lines should be skipped"
+        assert items[0] == {"query": "list files", "mode": "command", "index": 0}, "Plain lines are queries"
+        assert items[1]["id"] == 7 and items[1]["mode"] == "explain", "JSON lines keep their fields"
+        assert items[2]["mode"] == "command", "Unknown modes fall back to the default"
+        print("✅ Batch input parsed")
+        
+        def error(headers):
+            return types.SimpleNamespace(response=types.SimpleNamespace(headers=headers))
+        assert retry_after(error({"retry-after": "2"})) == 2
+        assert retry_after(error({"retry-after-ms": "1500"})) == 1.5
+        assert retry_after(error({})) is None
+        print("✅ Retry-After honored")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Batch input test failed: {e}")
+        return False
+
+def test_batch_runner():
+    """Test concurrent batch runs against a rate-limiting fake server"""
+    print("\n🧪 Testing batch runner...")
+    
+    try:
+        import openai  # noqa: F401
+    except ImportError:
+        print("⚠️ Batch runner test skipped (openai module not installed)")
+        return True
+    
+    temp_dir = tempfile.mkdtemp()
+    try:
+        import io
+        import threading
+        from openai import AuthenticationError
+        from sudothink.assistant import AITerminalAssistant
+        from sudothink.batch import BatchRunner, parse_queries
+        
+        with FakeBackend(temp_dir, rate_limit_every=2) as backend:
+            assistant = AITerminalAssistant()
+            collections = []
+            collect_context = assistant.collect_context
+            assistant.collect_context = lambda: collections.append(1) or collect_context()
+            
+            runner = BatchRunner(assistant, concurrency=2, use_cache=False)
+            lock = threading.Lock()
+            in_flight = [0, 0]  # now, most at once
+            create = runner._create
+            
+            def counting_create(request):
+                with lock:
+                    in_flight[0] += 1
+                    in_flight[1] = max(in_flight)
+                try:
+                    return create(request)
+                finally:
+                    with lock:
+                        in_flight[0] -= 1
+            
+            runner._create = counting_create
+            items = parse_queries(["list files", "disk usage", "show processes", "current branch"])
+            out = io.StringIO()
+            assert runner.run(items, out) == 0, "Rate-limited requests are retried until they succeed"
+            records = [json.loads(line) for line in out.getvalue().splitlines()]
+            assert sorted(r["index"] for r in records) == [0, 1, 2, 3] and all(r["response"] for r in records), \
+                "Every item gets a response"
+            assert backend.server.requests > len(items) and runner.gate.resume_at > 0, \
+                "429s paused every worker through the shared gate"
+            assert len(collections) == 1, "Context is collected once per batch"
+            assert in_flight[1] <= 2, "No more than the concurrency limit in flight"
+            print("✅ Batch answered through rate limiting")
+            
+            def unauthorized(request):
+                # Built without an HTTP response; only its type matters to the runner
+                raise AuthenticationError.__new__(AuthenticationError)
+            
+            runner = BatchRunner(assistant, concurrency=1, use_cache=False)
+            runner._create = unauthorized
+            out = io.StringIO()
+            assert runner.run(items, out) == len(items)
+            errors = [json.loads(line)["error"] for line in out.getvalue().splitlines()]
+            assert errors[0] == "Invalid OpenAI API key" and set(errors[1:]) == {"batch stopped"}, \
+                "An invalid key stops the rest of the batch"
+            print("✅ Batch stops on an invalid key")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Batch runner test failed: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir)
+
+def test_backend_settings():
+    """Test backend configuration and the fake server's replies"""
+    print("\n🧪 Testing backend settings...")
+    
+    try:
+        from sudothink.backend import Backend, DEFAULT_MODEL
+        from sudothink.fakeserver import fake_reply
+        
+        backend = Backend(api_key=None)
+        assert backend.model == DEFAULT_MODEL and backend.api_key is None, "Defaults to OpenAI"
+        backend = Backend(api_key=None, base_url="http://127.0.0.1:8765/v1", model="local")
+        assert backend.api_key and backend.model == "local", "Custom servers need no API key"
+        print("✅ Backend options applied")
+        
+        messages = [{"role": "user", "content": "USER REQUEST: list files\n\nTASK: Generate a single command"}]
+        assert fake_reply(messages) == fake_reply(messages), "Fake replies should be deterministic"
+        plan = [{"role": "user", "content": "USER REQUEST: deploy\n- Return a JSON array of steps"}]
+        assert isinstance(json.loads(fake_reply(plan)), list), "Fake plans should be valid JSON"
+        print("✅ Fake server replies deterministic")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Backend settings test failed: {e}")
+        return False
+
+def test_timings():
+    """Test timing spans and metrics summaries"""
+    print("\n🧪 Testing timings...")
+    
+    try:
+        from sudothink.timing import Timings, summarize
+        
+        timings = Timings()
+        with timings.span("collect"):
+            pass
+        timings.add("network", 0.1)
+        timings.add("network", 0.1)
+        spans = timings.as_ms()
+        assert list(spans) == ["collect", "network"], "Spans keep their order"
+        assert spans["network"] == 200.0, "Repeated spans accumulate"
+        print("✅ Spans recorded")
+        
+        lines = [json.dumps({"spans": {"total": ms}, "usage": {"total_tokens": 10}}) for ms in range(1, 101)]
+        summary = summarize(lines + ["not json"])
+        assert summary["total"]["count"] == 100
+        assert summary["total"]["p50"] in (50, 51) and summary["total"]["p95"] in (95, 96)
+        assert summary["usage.total_tokens"]["p95"] == 10
+        print("✅ Percentiles summarized")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Timings test failed: {e}")
+        return False
+
+def test_model_routing():
+    """Test complexity routing and command checks"""
+    print("\n🧪 Testing model routing...")
+    
+    try:
+        from sudothink.routing import ModelRouter, complexity_tier
+        from sudothink.validate import check_command, command_names
+        
+        assert complexity_tier("list files by size") == "simple"
+        assert complexity_tier("first install then configure and deploy") == "complex"
+        router = ModelRouter("big", routes={"command": {"simple": "small"}, "plan": "planner"},
+                             escalation=["small", "big"])
+        assert router.route("list files", "command") == "small", "Simple commands use the fast model"
+        assert router.route("install then configure nginx and deploy", "command") == "big"
+        assert router.route("list files", "plan") == "planner", "A string routes every tier"
+        assert router.escalate("small") == "big" and router.escalate("big") is None
+        print("✅ Queries routed by complexity")
+        
+        assert command_names("FOO=1 sudo apt update && cat f | grep x") == ["apt", "cat", "grep"]
+        assert check_command("ls -la | sort", available=["ls", "sort"]) == []
+        for command, names in [("sudo -u postgres psql", ["psql"]),
+                               ("nice -n 10 tar czf a.tgz .", ["tar"]),
+                               ("ls | xargs -I {} cp {} /tmp", ["ls", "cp"])]:
+            assert command_names(command) == names, f"Option values after a prefix are skipped: {command}"
+            assert check_command(command, available=names) == [], command
+        assert check_command("ls | nosuchcommand", available=["ls"]) == ["command not found: nosuchcommand"]
+        assert check_command("if then", available=[])[0].startswith("syntax error"), "Syntax errors are caught"
+        print("✅ Generated commands checked")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Model routing test failed: {e}")
+        return False
+
+def test_command_retrieval():
+    """Test retrieval of previously successful commands"""
+    print("\n🧪 Testing command retrieval...")
+    
+    temp_dir = tempfile.mkdtemp()
+    try:
+        from sudothink.interactions import InteractionLog
+        from sudothink.retrieval import Retriever, similarity, tokens
+        
+        assert similarity("list files by size", "list all the files by size") == 1.0
+        assert similarity("list files", "restart nginx") == 0.0
+        assert tokens("List files by size?") == tokens("list files by size")
+        assert tokens("copy a.txt to b.txt") != tokens("copy b.txt to a.txt"), "Argument order matters"
+        
+        log = InteractionLog(Path(temp_dir) / "interactions.db")
+        log.record("list all files sorted by size", "ls -laS", success=True)
+        log.record("show disk usage of folders", "du -sh *", success=True)
+        log.record("compress the logs folder", "tar czf logs.tgz logs", success=False)
+        log.record("copy notes.txt to backup.txt", "cp notes.txt backup.txt", success=True)
+        log.record("remove old builds", "rm -rf build")
+        retriever = Retriever(log)
+        
+        direct, examples = retriever.retrieve("List all files sorted by size?")
+        assert direct is not None and direct.command == "ls -laS", "The same request reuses the command"
+        direct, examples = retriever.retrieve("list files sorted by size")
+        assert direct is None and [m.command for m in examples] == ["ls -laS"], "Similar requests become examples"
+        direct, examples = retriever.retrieve("copy backup.txt to notes.txt")
+        assert direct is None and [m.command for m in examples] == ["cp notes.txt backup.txt"], \
+            "Reversed arguments are never answered directly"
+        direct, examples = retriever.retrieve("disk usage of every folder")
+        assert direct is None and [m.command for m in examples] == ["du -sh *"], "Looser matches become examples"
+        assert all(m.command != "tar czf logs.tgz logs" for m in retriever.lookup("compress logs folder")), \
+            "Failed commands are never offered"
+        print("✅ Similar commands found")
+        
+        assert not retriever.lookup("remove old builds"), "Commands not yet run are not offered"
+        log.mark_latest("remove old builds", True)
+        assert retriever.retrieve("remove old builds")[0].command == "rm -rf build", "Confirmed commands are"
+        log.mark_latest("list all files sorted by size", False)
+        assert all(m.command != "ls -laS" for m in retriever.lookup("list files sorted by size")), \
+            "Commands that later failed are dropped"
+        print("✅ Only confirmed commands offered")
+        
+        try:
+            import openai  # noqa: F401
+        except ImportError:
+            return True
+        from sudothink.assistant import AITerminalAssistant
+        
+        with FakeBackend(temp_dir):
+            assistant = AITerminalAssistant()
+            first = assistant.generate_response("show running processes")
+            assert assistant.generate_response("show running processes") == first
+            rows = assistant.interactions.search("show running processes")
+            assert len(rows) == 2 and all(row["success"] is None for row in rows), \
+                "Generated and cached answers are logged as not yet known"
+            assert not assistant.retriever.lookup("show running processes")
+        print("✅ Answers not logged as successes before they run")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Command retrieval test failed: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir)
+
+def test_prefetch():
+    """Test the context snapshot written by the shell hooks"""
+    print("\n🧪 Testing context prefetch...")
+    
+    temp_dir = tempfile.mkdtemp()
+    try:
+        from sudothink.prefetch import collect_snapshot, write_snapshot, load_snapshot, snapshot_file
+        
+        path = snapshot_file(temp_dir, 12345)
+        snapshot = collect_snapshot(temp_dir, cwd=temp_dir)
+        write_snapshot(path, snapshot)
+        values = load_snapshot(path, cwd=temp_dir)
+        assert "available_commands" in values, "Snapshot is used for its directory"
+        assert load_snapshot(path, cwd=os.path.dirname(temp_dir)) == {}, "Snapshot is ignored in other directories"
+        print("✅ Snapshot used only where it was taken")
+        
+        from sudothink.dirtree import DirectorySnapshot
+        assert "directory_structure" not in values, "The directory listing is never served from a snapshot"
+        assert os.path.exists(os.path.join(temp_dir, "dirtree_cache.json")), "Prefetch warms the listing cache"
+        os.mkdir(os.path.join(temp_dir, "created-after-prefetch"))
+        listing = DirectorySnapshot(os.path.join(temp_dir, "dirtree_cache.json")).snapshot(temp_dir)
+        assert "created-after-prefetch" in listing, "Directories created after the prefetch are listed"
+        print("✅ Directory listing read fresh")
+        
+        snapshot["created"] -= 3600
+        write_snapshot(path, snapshot)
+        assert load_snapshot(path, cwd=temp_dir) == {}, "Stale snapshots are ignored"
+        assert load_snapshot(os.path.join(temp_dir, "missing.json"), cwd=temp_dir) == {}
+        print("✅ Stale or missing snapshots ignored")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Context prefetch test failed: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir)
+
+def test_run_correction():
+    """Test the failure report sent by `sudothink run`"""
+    print("\n🧪 Testing run mode corrections...")
+    
+    try:
+        import io
+        from sudothink.run import run_command, failure_message
+        
+        echoed = io.StringIO()
+        status, tail = run_command("for i in $(seq 1 500); do echo line$i >&2; done; exit 3",
+                                   tail_bytes=512, echo=echoed)
+        assert status == 3, "Exit status is reported"
+        assert echoed.getvalue().count("\n") == 500, "Error output is passed through as it arrives"
+        assert tail.size <= 512 and tail.dropped > 0, "Only a bounded tail of stderr is kept"
+        message = failure_message(status, tail, lines=5)
+        assert "exit status 3" in message and "line500" in message and "line495" not in message, \
+            "Only the last lines are sent back"
+        print("✅ Bounded error tail sent")
+        
+        status, tail = run_command("exit 1", echo=io.StringIO())
+        assert "no error output" in failure_message(status, tail)
+        print("✅ Silent failures reported")
+        
+        status, tail = run_command("[[ -n $SHELL ]] && arr=(a b) && echo ${arr[1]} >&2", echo=io.StringIO())
+        assert status == 0, "Commands run in the shell they were validated with, not sh"
+        print("✅ Commands run in the user's shell")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Run mode test failed: {e}")
+        return False
+
+def test_streaming_plan():
+    """Test picking plan steps out of a streamed response"""
+    print("\n🧪 Testing streaming plan parser...")
+    
+    try:
+        from sudothink.plan import StreamingPlanParser, parse_plan
+        
+        response = ('Here is the plan [JSON]:\n```json\n[\n'
+                    '  {"id": "1", "description": "Build", "command": "echo \\"}]\\" && make", "depends_on": []},\n'
+                    '  {"id": "2", "description": "Test", "command": "make test", "depends_on": ["1"]}\n'
+                    ']\n```\nLet me know if you need changes.')
+        parser = StreamingPlanParser()
+        arrived = []
+        for i in range(0, len(response), 4):
+            arrived += [(i, step["id"]) for step in parser.feed(response[i:i + 4])]
+        assert [step_id for _, step_id in arrived] == ["1", "2"] and parser.finished and not parser.invalid
+        assert arrived[0][0] < response.index('"id": "2"'), "Step 1 is ready before step 2 arrives"
+        print("✅ Steps yielded as they complete")
+        
+        steps = parse_plan(response)
+        assert [step.id for step in steps] == ["1", "2"] and steps[0].command == 'echo "}]" && make', \
+            "Plans inside a markdown fence are accepted"
+        partial = StreamingPlanParser()
+        partial.feed(response[:response.index('"id": "2"')])
+        assert not partial.finished and len(partial.steps) == 1, "A cut-off plan is not complete"
+        print("✅ Markdown around the plan tolerated")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Streaming plan test failed: {e}")
+        return False
+
+def test_command_candidates():
+    """Test picking the first command candidate that passes local checks"""
+    print("\n🧪 Testing command candidates...")
+    
+    try:
+        from types import SimpleNamespace
+        from sudothink.candidates import generate_candidates
+        from sudothink.validate import check_command
+        
+        class Completions:
+            def __init__(self, replies):
+                self.replies = list(replies)
+                self.requests = []
+            
+            def create(self, **request):
+                self.requests.append(request)
+                count = request.get("n", 1)
+                replies, self.replies = self.replies[:count], self.replies[count:]
+                return SimpleNamespace(usage=None, choices=[
+                    SimpleNamespace(message=SimpleNamespace(content=reply)) for reply in replies
+                ])
+        
+        def client(replies):
+            return SimpleNamespace(chat=SimpleNamespace(completions=Completions(replies)))
+        
+        def check(command):
+            return check_command(command, available={"ls", "grep"})
+        
+        request = {"model": "test", "messages": [], "temperature": 0.1}
+        fake = client(["lss -la", "ls -la | grep txt", "ls"])
+        command, problems, _ = generate_candidates(fake, request, 3, check)
+        assert command == "ls -la | grep txt" and problems == [], "The first passing candidate is used"
+        assert len(fake.chat.completions.requests) == 1 and fake.chat.completions.requests[0]["n"] == 3
+        print("✅ Candidates requested with n")
+        
+        fake = client(["ls -la 'unterminated", "lss", "ls -la"])
+        command, problems, _ = generate_candidates(fake, request, 3, check, multiple_choices=False)
+        assert command == "ls -la" and len(fake.chat.completions.requests) == 3, "Concurrent requests without n"
+        command, problems, _ = generate_candidates(client(["lss"]), request, 1, check)
+        assert command == "lss" and problems == ["command not found: lss"], "Problems reported if none pass"
+        print("✅ Concurrent candidates checked")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Command candidates test failed: {e}")
+        return False
+
+def test_man_index():
+    """Test the local man page and --help index"""
+    print("\n🧪 Testing local manual index...")
+    
+    temp_dir = tempfile.mkdtemp()
+    try:
+        from sudothink.manindex import ManIndex, parse_options, split_flags, find_commands, is_flag_question
+        
+        page = """NAME
+       tar - an archiving utility
+
+OPTIONS
+       -x, --extract, --get
+              Extract files from an archive.
+
+              -- is not an option here
+       -f, --file=ARCHIVE
+              Use archive file.
+"""
+        help_text = """Usage: tar [OPTION...] [FILE]...
+  -t, --list                 list the contents of an archive
+      --delete               delete from the archive
+"""
+        assert [flags for flags, _ in parse_options(page)] == ["-x --extract --get", "-f --file"]
+        assert [flags for flags, _ in parse_options(help_text)] == ["-t --list", "--delete"]
+        assert split_flags("-xzvf") == ["-xzvf", "-x", "-z", "-v", "-f"] and split_flags("--file=a") == ["--file"]
+        print("✅ Man page and help options parsed")
+        
+        (name, flags, rest), = find_commands("what does ls -la do?")
+        assert name == "ls" and flags == ["-la"] and is_flag_question(rest)
+        (name, flags, rest), = find_commands("why does ls -la hang on this folder")
+        assert not is_flag_question(rest), "Questions that need reasoning go to the model"
+        print("✅ Flag questions recognized")
+        
+        index = ManIndex(Path(temp_dir) / "man_index.db")
+        answer, excerpts = index.explain("what does ls -a do")
+        assert answer is not None and "-a" in answer and excerpts, "Flag questions are answered locally"
+        options = index.stats()["options"]
+        assert index.ensure("ls") and index.stats()["options"] == options, "Unchanged programs are not re-indexed"
+        answer, excerpts = index.explain("why does ls -a show dot files")
+        assert answer is None and excerpts, "Other questions get manual excerpts"
+        print("✅ Manual answers and excerpts")
+        
+        bin_dir = Path(temp_dir) / "bin"
+        bin_dir.mkdir()
+        ran = Path(temp_dir) / "ran"
+        program = bin_dir / "sudothink-test-tool"
+        program.write_text(f"#!/bin/sh\ntouch {ran}\necho '  -x, --extract    unpack everything'\n")
+        program.chmod(0o755)
+        saved_path = os.environ["PATH"]
+        os.environ["PATH"] = f"{bin_dir}{os.pathsep}{saved_path}"
+        try:
+            man_only = not index.ensure(program.name) and not ran.exists()
+            opted_in = ManIndex(Path(temp_dir) / "opt_in.db", help_programs=[program.name])
+            indexed = opted_in.ensure(program.name) and opted_in.describe_flags(program.name, ["-x"])["-x"]
+        finally:
+            os.environ["PATH"] = saved_path
+        assert man_only, "Programs not known to support --help are never run"
+        assert indexed and ran.exists(), "Programs opted in through man_help_programs are"
+        print("✅ --help only run for allowed programs")
+        
+        return True
+    except Exception as e:
+        print(f"❌ Manual index test failed: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir)
+
+def test_daemon_round_trip():
+    """Test the warm daemon over a temporary socket"""
+    print("\n🧪 Testing daemon round trip...")
+    
+    try:
+        import openai  # noqa: F401
+    except ImportError:
+        print("⚠️ Daemon test skipped (openai module not installed)")
+        return True
+    
+    temp_dir = tempfile.mkdtemp()
+    try:
+        import threading
+        from sudothink.assistant import AITerminalAssistant
+        from sudothink.daemon import AssistantDaemon, DaemonClient, send_request
+        
+        previous_dir = os.getcwd()
+        with FakeBackend(temp_dir) as backend:
+            path = os.path.join(temp_dir, "daemon.sock")
+            server = AssistantDaemon(AITerminalAssistant(), path)
+            thread = threading.Thread(target=server.serve_forever, daemon=True)
+            thread.start()
+            try:
+                os.environ.pop("SUDOTHINK_NO_DAEMON")
+                client = DaemonClient.connect(path)
+                assert client is not None, "The daemon answers pings"
+                print("✅ Daemon answers pings")
+                
+                seen = {}
+                generate = server.assistant.generate_response
+                
+                def recording_generate(*args, **kwargs):
+                    seen["path"] = os.environ.get("PATH")
+                    return generate(*args, **kwargs)
+                
+                server.assistant.generate_response = recording_generate
+                daemon_path = os.environ.get("PATH")
+                os.environ["PATH"] = os.pathsep.join([temp_dir, daemon_path or ""])
+                try:
+                    command = client.generate_response("list files", use_cache=False)
+                finally:
+                    os.environ["PATH"] = daemon_path
+                assert command and client.last_metrics.get("model"), "Generation goes through the daemon"
+                assert seen["path"].startswith(temp_dir), "The caller's PATH is used for the request"
+                print("✅ Generation uses the caller's environment")
+                
+                import time
+                server.assistant.generate_response = generate
+                client.generate_response("show disk usage")
+                backend.server.latency = 1.5
+                slow = threading.Thread(target=DaemonClient.connect(path).generate_response,
+                                        args=("explain what a symlink is",), kwargs={"mode": "explain", "use_cache": False})
+                slow.start()
+                time.sleep(0.3)
+                started = time.monotonic()
+                assert client.generate_response("show disk usage") and client.last_metrics.get("cached")
+                assert time.monotonic() - started < 1, "A request doesn't wait for another's network round trip"
+                assert os.getcwd() == previous_dir, "The daemon's own directory is restored"
+                slow.join(5)
+                backend.server.latency = 0
+                print("✅ Requests overlap while one waits on the network")
+                
+                assert send_request({"action": "shutdown"}, path=path) == {"ok": True}, "Shutdown is acknowledged"
+                thread.join(5)
+                assert not thread.is_alive(), "The daemon stops after shutdown"
+                print("✅ Daemon stops cleanly")
+            finally:
+                if thread.is_alive():
+                    server.shutdown()
+                server.server_close()
+            assert not os.path.exists(path), "The socket is removed"
+        
+        return True
+    except Exception as e:
+        print(f"❌ Daemon test failed: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_dir)
+
 def run_integration_test():
     """Run a full integration test"""
     print("\n🧪 Running integration test...")
@@ -206,6 +1304,31 @@ def main():
         test_api_key_validation,
         test_config_file_permissions,
         test_backward_compatibility,
+        test_lazy_imports,
+        test_path_index,
+        test_history_reader,
+        test_directory_snapshot,
+        test_context_collection,
+        test_response_cache,
+        test_streaming_response,
+        test_chat_session,
+        test_context_store,
+        test_prompt_budget,
+        test_interaction_rotation,
+        test_plan_process_groups,
+        test_plan_parsing,
+        test_batch_input,
+        test_batch_runner,
+        test_backend_settings,
+        test_timings,
+        test_model_routing,
+        test_command_retrieval,
+        test_prefetch,
+        test_run_correction,
+        test_streaming_plan,
+        test_command_candidates,
+        test_man_index,
+        test_daemon_round_trip,
         run_integration_test
     ]
     